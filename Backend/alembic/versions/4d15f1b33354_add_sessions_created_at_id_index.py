@@ -0,0 +1,25 @@
+"""Add sessions (created_at, id) index
+
+Revision ID: 4d15f1b33354
+Revises: 6b1f3b220a7a
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '4d15f1b33354'
+down_revision = '6b1f3b220a7a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_sessions_created_at_id', 'sessions', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sessions_created_at_id', table_name='sessions')
@@ -0,0 +1,38 @@
+"""Add session reconciliation columns
+
+Revision ID: a7c3e91d2f40
+Revises: 4d15f1b33354
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e91d2f40'
+down_revision = '4d15f1b33354'
+branch_labels = None
+depends_on = None
+
+_INDEXED = ('missing_count', 'extra_count', 'duplicate_count', 'is_complete')
+
+
+def upgrade() -> None:
+    op.add_column('sessions', sa.Column('reconciliation_version', sa.String(length=32), nullable=True))
+    op.add_column('sessions', sa.Column('missing_count', sa.Integer(), nullable=True))
+    op.add_column('sessions', sa.Column('extra_count', sa.Integer(), nullable=True))
+    op.add_column('sessions', sa.Column('duplicate_count', sa.Integer(), nullable=True))
+    op.add_column('sessions', sa.Column('is_complete', sa.Boolean(), nullable=True))
+    op.add_column('sessions', sa.Column('reconciliation', sa.JSON(), nullable=True))
+    for column in _INDEXED:
+        op.create_index(f'ix_sessions_{column}', 'sessions', [column], unique=False)
+
+
+def downgrade() -> None:
+    for column in _INDEXED:
+        op.drop_index(f'ix_sessions_{column}', table_name='sessions')
+    with op.batch_alter_table('sessions') as batch_op:
+        for column in ('reconciliation', *_INDEXED, 'reconciliation_version'):
+            batch_op.drop_column(column)
@@ -0,0 +1,25 @@
+"""Add sessions photo index
+
+Revision ID: b5e2d8c4f917
+Revises: a7c3e91d2f40
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b5e2d8c4f917'
+down_revision = 'a7c3e91d2f40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_sessions_photo'), 'sessions', ['photo'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_sessions_photo'), table_name='sessions')
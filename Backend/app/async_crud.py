@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from typing import Any, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas
+from .crud import bulk_insert_query, sessions_query, sort_created, status_query
+
+
+# Async counterparts of `crud`; keep both modules behaviourally identical.
+
+
+async def get_session(db: AsyncSession, session_id: int) -> Optional[models.Session]:
+    return await db.get(models.Session, session_id)
+
+
+async def get_sessions(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    filters: Optional[schemas.SessionFilter] = None,
+    cursor: Optional[str] = None,
+) -> List[models.Session]:
+    result = await db.scalars(sessions_query(filters, skip, limit, cursor))
+    return list(result.all())
+
+
+async def get_session_summaries(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    filters: Optional[schemas.SessionFilter] = None,
+    cursor: Optional[str] = None,
+) -> List[Any]:
+    result = await db.execute(sessions_query(filters, skip, limit, cursor, summary=True))
+    return list(result.all())
+
+
+async def create_session(db: AsyncSession, session_in: schemas.SessionCreate) -> models.Session:
+    db_obj = models.Session(**session_in.model_dump())
+    db.add(db_obj)
+    await db.commit()
+    await db.refresh(db_obj)
+    return db_obj
+
+
+async def create_sessions(db: AsyncSession, sessions_in: List[schemas.SessionCreate]) -> List[models.Session]:
+    stmt, rows = bulk_insert_query(sessions_in)
+    created = sort_created((await db.scalars(stmt, rows)).all())
+    # AsyncSessionLocal does not expire on commit, so the RETURNING values stay loaded
+    await db.commit()
+    return created
+
+
+async def get_session_statuses(db: AsyncSession, session_ids: List[int]) -> List[Any]:
+    result = await db.execute(status_query(session_ids))
+    return list(result.all())
+
+
+async def update_session(
+    db: AsyncSession, db_obj: models.Session, session_in: schemas.SessionUpdate
+) -> models.Session:
+    data = session_in.model_dump(exclude_unset=True)
+    for field, value in data.items():
+        setattr(db_obj, field, value)
+    db.add(db_obj)
+    await db.commit()
+    await db.refresh(db_obj)
+    return db_obj
+
+
+async def delete_session(db: AsyncSession, session_id: int) -> bool:
+    db_obj = await get_session(db, session_id)
+    if not db_obj:
+        return False
+    await db.delete(db_obj)
+    await db.commit()
+    return True
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, Protocol, Tuple, TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """Small in-process LRU cache with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: V) -> None:
+        if not self.enabled:
+            return
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class CacheBackend(Protocol):
+    """Storage for SWRCache entries. Values are (stored_at wall-clock seconds, JSON-able value)."""
+
+    async def get(self, key: str) -> Optional[Tuple[float, Any]]: ...
+
+    async def set(self, key: str, value: Any, stored_at: float, ttl: float) -> None: ...
+
+
+class InMemoryBackend:
+    """Process-local backend; also the stand-in for a shared backend in tests."""
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, float, Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, stored_at, value = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return stored_at, value
+
+    async def set(self, key: str, value: Any, stored_at: float, ttl: float) -> None:
+        self._entries[key] = (stored_at + ttl, stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class RedisBackend:
+    """Shared backend so several Backend replicas reuse each other's results. Needs `redis`."""
+
+    def __init__(self, url: str, prefix: str = "cache:", timeout: float = 1.0):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        # Short timeouts: SWRCache falls back to the loader when Redis is unreachable
+        self._redis = redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    async def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        raw = await self._redis.get(self.prefix + key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return data["stored_at"], data["value"]
+
+    async def set(self, key: str, value: Any, stored_at: float, ttl: float) -> None:
+        payload = json.dumps({"stored_at": stored_at, "value": value})
+        await self._redis.set(self.prefix + key, payload, ex=max(1, int(ttl)))
+
+
+def make_backend(url: Optional[str], prefix: str) -> CacheBackend:
+    if url and url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url, prefix=prefix)
+    return InMemoryBackend()
+
+
+class SWRCache(Generic[V]):
+    """
+    Read-through cache with stale-while-revalidate and single-flight loading.
+
+    Entries younger than `ttl` are served as is. Entries up to `ttl + stale_ttl` old
+    are served immediately while one background refresh runs. Concurrent misses for
+    the same key share a single `loader` call. Backend errors are logged and treated as
+    a miss (read) or ignored (write), so an unavailable shared cache never fails a request.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Awaitable[V]],
+        ttl: float,
+        stale_ttl: float = 0.0,
+        backend: Optional[CacheBackend] = None,
+    ):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.backend: CacheBackend = backend if backend is not None else InMemoryBackend()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.backend_errors = 0
+        self._inflight: Dict[str, "asyncio.Task[V]"] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def get(self, key: str) -> V:
+        if not self.enabled:
+            return await self.loader(key)
+        try:
+            entry = await self.backend.get(key)
+        except Exception as e:
+            self.backend_errors += 1
+            logger.warning("Cache backend read failed, loading %r directly: %s", key, e)
+            entry = None
+        if entry is not None:
+            stored_at, value = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                self.hits += 1
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._load(key).add_done_callback(self._log_refresh_error)
+                return value
+        self.misses += 1
+        return await asyncio.shield(self._load(key))
+
+    def _load(self, key: str) -> "asyncio.Task[V]":
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_store(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def _fetch_and_store(self, key: str) -> V:
+        value = await self.loader(key)
+        try:
+            await self.backend.set(key, value, time.time(), self.ttl + self.stale_ttl)
+        except Exception as e:
+            self.backend_errors += 1
+            logger.warning("Cache backend write failed for %r: %s", key, e)
+        return value
+
+    @staticmethod
+    def _log_refresh_error(task: "asyncio.Task[Any]") -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Background cache refresh failed: %s", task.exception())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "backend_errors": self.backend_errors,
+        }
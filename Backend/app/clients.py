@@ -1,15 +1,110 @@
 from __future__ import annotations
 
+import hashlib
 import os
 from datetime import datetime, timedelta
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import httpx
+from starlette.concurrency import run_in_threadpool
+
+from . import tracing
+from .cache import SWRCache, TTLCache, make_backend
+from .imaging import make_inference_copy, rescale_bboxes
+from .metrics import ML_IN_FLIGHT, observe_stage
 
 
 ORDERS_SERVICE_URL = os.getenv("ORDERS_SERVICE_URL", "mock")
 ML_SERVICE_URL = os.getenv("ML_SERVICE_URL", "mock")
 
+# Default timeouts (seconds) per upstream, overridable with <UPSTREAM>_TIMEOUT
+_DEFAULT_TIMEOUTS = {"orders": 15.0, "ml": 120.0}
+
+# Optional cache of ML responses; off unless ML_RESPONSE_CACHE_SIZE > 0. Keyed by photo hash plus
+# the conf/imgsz/tiling defaults and model fingerprint reported by GET /info, so a model swap misses
+# once the /info cache refreshes. Without /info there is no model identity and nothing is cached.
+_ml_response_cache: TTLCache[Dict[str, Any]] = TTLCache(
+    max_entries=int(os.getenv("ML_RESPONSE_CACHE_SIZE", "0")),
+    ttl=float(os.getenv("ML_RESPONSE_CACHE_TTL", "300")),
+)
+
+# Photos are downscaled and re-encoded before /analyze (the original stays in storage).
+# The target longest side comes from the ML service's GET /info unless ML_INPUT_MAX_SIDE is set.
+ML_DOWNSCALE = os.getenv("ML_DOWNSCALE", "1") == "1"
+ML_INPUT_MAX_SIDE = int(os.getenv("ML_INPUT_MAX_SIDE", "0"))
+ML_INPUT_JPEG_QUALITY = int(os.getenv("ML_INPUT_JPEG_QUALITY", "90"))
+
+# Application-scoped clients, one per upstream. Created in the app lifespan.
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def _inject_trace_context(request: httpx.Request) -> None:
+    tracing.inject(request.headers)
+
+
+def _create_client(upstream: str, base_url: str) -> httpx.AsyncClient:
+    """Build a pooled client for an upstream, configured by <UPSTREAM>_* env vars."""
+    prefix = upstream.upper()
+    timeout = _env_float(f"{prefix}_TIMEOUT", _DEFAULT_TIMEOUTS[upstream])
+    limits = httpx.Limits(
+        max_connections=_env_int(f"{prefix}_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=_env_int(f"{prefix}_MAX_KEEPALIVE", 20),
+        keepalive_expiry=_env_float(f"{prefix}_KEEPALIVE_EXPIRY", 30.0),
+    )
+    # HTTP/2 is negotiated via ALPN, so plain http:// upstreams stay on HTTP/1.1
+    http2 = os.getenv(f"{prefix}_HTTP2", "1") == "1" and _http2_available()
+    return httpx.AsyncClient(
+        base_url=base_url,
+        timeout=httpx.Timeout(timeout, connect=_env_float(f"{prefix}_CONNECT_TIMEOUT", 5.0)),
+        limits=limits,
+        http2=http2,
+        # Propagates the W3C trace context so upstream spans join the caller's trace
+        event_hooks={"request": [_inject_trace_context]},
+    )
+
+
+def _upstream_urls() -> Dict[str, str]:
+    return {"orders": ORDERS_SERVICE_URL, "ml": ML_SERVICE_URL}
+
+
+async def init_clients() -> None:
+    for upstream, base_url in _upstream_urls().items():
+        if base_url != "mock" and upstream not in _clients:
+            _clients[upstream] = _create_client(upstream, base_url)
+
+
+async def close_clients() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def get_client(upstream: str) -> httpx.AsyncClient:
+    client = _clients.get(upstream)
+    if client is None:
+        # Outside of the app lifespan (scripts, shells) create the client lazily
+        client = _clients[upstream] = _create_client(upstream, _upstream_urls()[upstream])
+    return client
+
 
 def _mock_orders_response() -> List[Dict[str, Any]]:
     now = datetime.utcnow()
@@ -157,20 +252,32 @@ def _mock_orders_response() -> List[Dict[str, Any]]:
     ]
 
 
-async def fetch_orders_by_employee(employee_id: str) -> List[Dict[str, Any]]:
+async def _fetch_orders_from_upstream(employee_id: str) -> List[Dict[str, Any]]:
     if ORDERS_SERVICE_URL == "mock":
         return [o for o in _mock_orders_response() if o.get("employee_id") == employee_id]
 
-    url = f"{ORDERS_SERVICE_URL}/orders"
-    async with httpx.AsyncClient(timeout=15) as client:
-        resp = await client.get(url, params={"employee_id": employee_id})
-        resp.raise_for_status()
-        data = resp.json()
-        if isinstance(data, dict) and "items" in data:
-            return data["items"]
-        if isinstance(data, list):
-            return data
-        return []
+    resp = await get_client("orders").get("/orders", params={"employee_id": employee_id})
+    resp.raise_for_status()
+    data = resp.json()
+    if isinstance(data, dict) and "items" in data:
+        return data["items"]
+    if isinstance(data, list):
+        return data
+    return []
+
+
+# Per-employee orders cache. ORDERS_CACHE_TTL=0 disables it; ORDERS_CACHE_URL=redis://...
+# shares entries between Backend replicas, otherwise they are kept in-process.
+_orders_cache: SWRCache[List[Dict[str, Any]]] = SWRCache(
+    _fetch_orders_from_upstream,
+    ttl=float(os.getenv("ORDERS_CACHE_TTL", "60")),
+    stale_ttl=float(os.getenv("ORDERS_CACHE_STALE_TTL", "300")),
+    backend=make_backend(os.getenv("ORDERS_CACHE_URL"), prefix="orders:"),
+)
+
+
+async def fetch_orders_by_employee(employee_id: str) -> List[Dict[str, Any]]:
+    return await _orders_cache.get(employee_id)
 
 
 def _mock_ml_response() -> Dict[str, Any]:
@@ -225,17 +332,74 @@ def _mock_ml_response() -> Dict[str, Any]:
     }
 
 
+async def _fetch_ml_info(_: str) -> Dict[str, Any]:
+    resp = await get_client("ml").get("/info")
+    resp.raise_for_status()
+    return resp.json()
+
+
+_ml_info_cache: SWRCache[Dict[str, Any]] = SWRCache(_fetch_ml_info, ttl=300.0, stale_ttl=3600.0)
+
+
+async def _ml_info() -> Optional[Dict[str, Any]]:
+    try:
+        return await _ml_info_cache.get("info")
+    except (httpx.HTTPError, ValueError):
+        # Older ML builds have no /info
+        return None
+
+
+async def _ml_input_max_side() -> int:
+    """Longest side worth sending to ML; 0 means send the original."""
+    if ML_INPUT_MAX_SIDE > 0:
+        return ML_INPUT_MAX_SIDE
+    info = await _ml_info()
+    return int(info.get("input_size") or 0) if info else 0
+
+
+def _ml_response_cache_key(photo_content: bytes, info: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Everything that decides the /analyze answer for these bytes; None when the model is unknown."""
+    fingerprint = info.get("model_fingerprint") if info else None
+    if not fingerprint:
+        return None
+    tiled = bool((info.get("tiling") or {}).get("default"))
+    digest = hashlib.sha256(photo_content).hexdigest()
+    return f"{digest}:{info.get('conf')}:{info.get('imgsz')}:{int(tiled)}:{fingerprint}"
+
+
 async def process_photo_with_ml(photo_content: bytes, filename: str) -> Dict[str, Any]:
     """Send photo to ML service and get actual_tools response."""
     if ML_SERVICE_URL == "mock":
         return _mock_ml_response()
     
-    url = f"{ML_SERVICE_URL}/analyze"
-    files = {"file": (filename, photo_content, "image/jpeg")}
-    
-    async with httpx.AsyncClient(timeout=120) as client:
-        resp = await client.post(url, files=files)
+    cache_key = None
+    if _ml_response_cache.enabled:
+        cache_key = _ml_response_cache_key(photo_content, await _ml_info())
+        cached = _ml_response_cache.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            return cached
+
+    copy = None
+    if ML_DOWNSCALE:
+        max_side = await _ml_input_max_side()
+        if max_side > 0:
+            with observe_stage("ml_downscale"):
+                copy = await run_in_threadpool(make_inference_copy, photo_content, max_side, ML_INPUT_JPEG_QUALITY)
+
+    if copy is not None:
+        files = {"file": (filename, copy.content, "image/jpeg")}
+    else:
+        files = {"file": (filename, photo_content, "image/jpeg")}
+
+    with ML_IN_FLIGHT.track_inprogress(), observe_stage("ml_roundtrip"):
+        resp = await get_client("ml").post("/analyze", files=files)
         resp.raise_for_status()
-        return resp.json()
+    data = resp.json()
+    if copy is not None and isinstance(data.get("bboxes"), list):
+        # Report boxes in the original photo's coordinates, as if it had been sent as is
+        data["bboxes"] = rescale_bboxes(data["bboxes"], copy.scale_x, copy.scale_y)
+    if cache_key is not None:
+        _ml_response_cache.set(cache_key, data)
+    return data
 
 
@@ -1,24 +1,134 @@
 from __future__ import annotations
 
-from typing import List, Optional
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
 
+from sqlalchemy import Select, func, insert, select, tuple_
 from sqlalchemy.orm import Session as OrmSession
 
 from . import models, schemas
 
 
+# Listing projection without the heavy JSON columns (actual_tools / detected_tools)
+SUMMARY_COLUMNS = (
+    models.Session.id,
+    models.Session.employee_id,
+    models.Session.order_id,
+    models.Session.status,
+    models.Session.photo,
+    models.Session.photo_uploaded_at,
+    models.Session.sent_to_ml_at,
+    models.Session.processed_at,
+    models.Session.missing_count,
+    models.Session.extra_count,
+    models.Session.duplicate_count,
+    models.Session.is_complete,
+    models.Session.created_at,
+    models.Session.updated_at,
+)
+
+# Progress columns returned by the batch status lookup
+STATUS_COLUMNS = (
+    models.Session.id,
+    models.Session.status,
+    models.Session.photo_uploaded_at,
+    models.Session.sent_to_ml_at,
+    models.Session.processed_at,
+    models.Session.is_complete,
+    models.Session.updated_at,
+)
+
+
+def encode_cursor(created_at: datetime, session_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{session_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, session_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(session_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def next_cursor(rows: List[Any], limit: int) -> Optional[str]:
+    """Cursor for the page after `rows`, or None if this was the last page."""
+    if len(rows) < limit or not rows:
+        return None
+    last = rows[-1]
+    return encode_cursor(last.created_at, last.id)
+
+
+def sessions_query(
+    filters: Optional[schemas.SessionFilter] = None,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    summary: bool = False,
+) -> Select:
+    """
+    Newest-first listing ordered by (created_at, id).
+
+    With `cursor` the page starts right after the row the cursor points at (keyset
+    pagination on the ix_sessions_created_at_id index); `skip` is only used without it.
+    """
+    stmt = select(*SUMMARY_COLUMNS) if summary else select(models.Session)
+    if filters is not None:
+        if filters.employee_id is not None:
+            stmt = stmt.where(models.Session.employee_id == filters.employee_id)
+        if filters.order_id is not None:
+            stmt = stmt.where(models.Session.order_id == filters.order_id)
+        if filters.status is not None:
+            stmt = stmt.where(models.Session.status == filters.status.value)
+        if filters.created_from is not None:
+            stmt = stmt.where(models.Session.created_at >= filters.created_from)
+        if filters.created_to is not None:
+            stmt = stmt.where(models.Session.created_at < filters.created_to)
+        if filters.is_complete is not None:
+            stmt = stmt.where(models.Session.is_complete == filters.is_complete)
+    if cursor is not None:
+        created_at, session_id = decode_cursor(cursor)
+        # Compare against the stored created_at of the cursor row, not the bound value: SQLite keeps
+        # server_default timestamps as text without microseconds, so a bound datetime would compare
+        # as a different string. The cursor's own value only matters if that row was deleted.
+        boundary = func.coalesce(
+            select(models.Session.created_at).where(models.Session.id == session_id).scalar_subquery(),
+            created_at,
+        )
+        # A row-value comparison, unlike the equivalent OR, is an index range condition on
+        # ix_sessions_created_at_id, so a deep page starts at the cursor instead of filtering up to it
+        stmt = stmt.where(tuple_(models.Session.created_at, models.Session.id) < tuple_(boundary, session_id))
+    elif skip:
+        stmt = stmt.offset(skip)
+    return stmt.order_by(models.Session.created_at.desc(), models.Session.id.desc()).limit(limit)
+
+
 def get_session(db: OrmSession, session_id: int) -> Optional[models.Session]:
     return db.get(models.Session, session_id)
 
 
-def get_sessions(db: OrmSession, skip: int = 0, limit: int = 100) -> List[models.Session]:
-    return (
-        db.query(models.Session)
-        .order_by(models.Session.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+def get_sessions(
+    db: OrmSession,
+    skip: int = 0,
+    limit: int = 100,
+    filters: Optional[schemas.SessionFilter] = None,
+    cursor: Optional[str] = None,
+) -> List[models.Session]:
+    return list(db.scalars(sessions_query(filters, skip, limit, cursor)).all())
+
+
+def get_session_summaries(
+    db: OrmSession,
+    skip: int = 0,
+    limit: int = 100,
+    filters: Optional[schemas.SessionFilter] = None,
+    cursor: Optional[str] = None,
+) -> List[Any]:
+    return list(db.execute(sessions_query(filters, skip, limit, cursor, summary=True)).all())
 
 
 def create_session(db: OrmSession, session_in: schemas.SessionCreate) -> models.Session:
@@ -29,6 +139,39 @@ def create_session(db: OrmSession, session_in: schemas.SessionCreate) -> models.
     return db_obj
 
 
+def bulk_insert_query(sessions_in: List[schemas.SessionCreate]) -> Tuple[Any, List[dict]]:
+    """
+    One INSERT ... RETURNING for all rows: SQLAlchemy sends the parameter sets as a
+    single multi-row VALUES statement (split every 1000 rows).
+    """
+    # sort_by_parameter_order would fall back to one statement per row on tables without
+    # a sentinel column; ids are assigned in VALUES order, so sort_created() restores it
+    stmt = insert(models.Session).returning(models.Session)
+    return stmt, [s.model_dump() for s in sessions_in]
+
+
+def sort_created(rows: List[models.Session]) -> List[models.Session]:
+    return sorted(rows, key=lambda row: row.id)
+
+
+def status_query(session_ids: List[int]) -> Select:
+    return select(*STATUS_COLUMNS).where(models.Session.id.in_(session_ids)).order_by(models.Session.id)
+
+
+def create_sessions(db: OrmSession, sessions_in: List[schemas.SessionCreate]) -> List[models.Session]:
+    stmt, rows = bulk_insert_query(sessions_in)
+    created = sort_created(db.scalars(stmt, rows).all())
+    # Detach before commit so the returned rows are not expired and reloaded one by one
+    for db_obj in created:
+        db.expunge(db_obj)
+    db.commit()
+    return created
+
+
+def get_session_statuses(db: OrmSession, session_ids: List[int]) -> List[Any]:
+    return list(db.execute(status_query(session_ids)).all())
+
+
 def update_session(
     db: OrmSession, db_obj: models.Session, session_in: schemas.SessionUpdate
 ) -> models.Session:
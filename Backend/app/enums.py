@@ -8,3 +8,4 @@ class SessionStatus(str, Enum):
     photo_uploaded = "photo_uploaded"
     sent_to_ml = "sent_to_ml"
     processed = "processed"
+    failed = "failed"
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import io
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from PIL import Image
+
+
+class InferenceCopy(NamedTuple):
+    content: bytes
+    scale_x: float  # original width / copy width
+    scale_y: float  # original height / copy height
+
+
+def make_inference_copy(content: bytes, max_side: int, quality: int = 90) -> Optional[InferenceCopy]:
+    """
+    Downscale a photo so its longest side is at most `max_side` and re-encode it as JPEG.
+
+    Returns None when the photo is already small enough or can't be read, in which case
+    the original bytes should be sent. EXIF orientation is deliberately not applied and
+    metadata is dropped: the ML service works on raw pixel orientation, so boxes computed
+    on the copy map back onto the original by plain scaling.
+    """
+    try:
+        img = Image.open(io.BytesIO(content))
+        width, height = img.size
+        if max_side <= 0 or max(width, height) <= max_side:
+            return None
+        ratio = max_side / max(width, height)
+        size = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+        # For JPEG, draft() lets libjpeg decode at 1/2..1/8 scale instead of full resolution
+        img.draft("RGB", size)
+        img = img.convert("RGB").resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return InferenceCopy(buf.getvalue(), width / size[0], height / size[1])
+
+
+def rescale_bboxes(bboxes: List[Dict[str, Any]], scale_x: float, scale_y: float) -> List[Dict[str, Any]]:
+    """Map box coordinates from the inference copy back onto the original photo."""
+    scaled = []
+    for box in bboxes:
+        box = dict(box)
+        for key, scale in (("x1", scale_x), ("x2", scale_x), ("y1", scale_y), ("y2", scale_y)):
+            if isinstance(box.get(key), (int, float)):
+                box[key] = box[key] * scale
+        scaled.append(box)
+    return scaled
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+from .tracing import span
+
+
+# Seconds; covers fast DB/disk steps as well as multi-second ML round-trips
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+REQUEST_LATENCY = Histogram(
+    "backend_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "backend_http_requests_in_progress", "Requests currently being handled", multiprocess_mode="livesum"
+)
+STAGE_LATENCY = Histogram(
+    "backend_stage_duration_seconds",
+    "Latency of individual processing stages (upload_write, photo_read, ml_roundtrip, ...)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_ERRORS = Counter("backend_stage_errors_total", "Failed processing stages", ["stage"])
+SESSION_MILESTONE_LATENCY = Histogram(
+    "backend_session_milestone_seconds",
+    "Time between Session timestamps: upload_to_ml (photo_uploaded_at -> sent_to_ml_at, the background "
+    "queue wait; 0 for inline uploads), ml_to_processed (sent_to_ml_at -> processed_at)",
+    ["milestone"],
+    buckets=LATENCY_BUCKETS + (300.0, 900.0),
+)
+ML_IN_FLIGHT = Gauge("backend_ml_requests_in_flight", "Outstanding /analyze calls", multiprocess_mode="livesum")
+THREADPOOL_BUSY = Gauge(
+    "backend_threadpool_busy_threads", "Worker threads in use by run_in_threadpool", multiprocess_mode="livesum"
+)
+THREADPOOL_SIZE = Gauge("backend_threadpool_size", "run_in_threadpool thread limit", multiprocess_mode="liveall")
+PHOTO_QUEUE_DEPTH = Gauge(
+    "backend_photo_queue_depth", "Sessions waiting for background ML processing", multiprocess_mode="livesum"
+)
+
+
+@contextmanager
+def observe_stage(stage: str, **attributes: Any) -> Iterator[None]:
+    """Time a stage into STAGE_LATENCY; inside a sampled trace it also becomes a span."""
+    started = time.perf_counter()
+    try:
+        with span(stage, **attributes):
+            yield
+    except BaseException:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - started)
+
+
+def observe_session_milestones(session: Any) -> None:
+    """Record the gaps between the processing timestamps of a freshly processed session."""
+    uploaded = getattr(session, "photo_uploaded_at", None)
+    sent = getattr(session, "sent_to_ml_at", None)
+    processed = getattr(session, "processed_at", None)
+    if uploaded is not None and sent is not None:
+        SESSION_MILESTONE_LATENCY.labels("upload_to_ml").observe(max(0.0, (sent - uploaded).total_seconds()))
+    if sent is not None and processed is not None:
+        SESSION_MILESTONE_LATENCY.labels("ml_to_processed").observe(max(0.0, (processed - sent).total_seconds()))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by its route template."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.labels(scope["method"], template, str(status_code)).observe(
+                time.perf_counter() - started
+            )
+
+
+def _update_runtime_gauges(photo_queue_depth: Optional[int]) -> None:
+    from anyio.to_thread import current_default_thread_limiter
+
+    limiter = current_default_thread_limiter()
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_SIZE.set(limiter.total_tokens)
+    if photo_queue_depth is not None:
+        PHOTO_QUEUE_DEPTH.set(photo_queue_depth)
+
+
+def render_metrics(photo_queue_depth: Optional[int] = None) -> Tuple[bytes, str]:
+    """
+    Exposition payload for GET /metrics. With PROMETHEUS_MULTIPROC_DIR set (several uvicorn
+    workers), samples from all worker processes are aggregated.
+    """
+    _update_runtime_gauges(photo_queue_depth)
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from sqlalchemy import DateTime, Integer, String, func
+from sqlalchemy import Boolean, DateTime, Index, Integer, String, func
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.types import JSON
 
@@ -10,6 +10,10 @@ from .enums import SessionStatus
 
 class Session(Base):
     __tablename__ = "sessions"
+    __table_args__ = (
+        # Keyset pagination for GET /sessions/ walks (created_at, id) newest-first
+        Index("ix_sessions_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     employee_id: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
@@ -23,11 +27,19 @@ class Session(Base):
     sent_to_ml_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), nullable=True)
     processed_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), nullable=True)
 
-    # Photo path or URL
-    photo: Mapped[str | None] = mapped_column(String(1024), nullable=True)
+    # Photo path or URL; indexed because PhotoStore.release() counts the sessions sharing a file
+    photo: Mapped[str | None] = mapped_column(String(1024), index=True, nullable=True)
     actual_tools: Mapped[list[str] | None] = mapped_column(JSON, nullable=True)
     detected_tools: Mapped[list[str] | None] = mapped_column(JSON, nullable=True)
 
+    # Reconciliation of detected_tools against actual_tools, filled when processing finishes
+    reconciliation_version: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    missing_count: Mapped[int | None] = mapped_column(Integer, index=True, nullable=True)
+    extra_count: Mapped[int | None] = mapped_column(Integer, index=True, nullable=True)
+    duplicate_count: Mapped[int | None] = mapped_column(Integer, index=True, nullable=True)
+    is_complete: Mapped[bool | None] = mapped_column(Boolean, index=True, nullable=True)
+    reconciliation: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+
     created_at: Mapped["DateTime"] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
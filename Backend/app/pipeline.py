@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import weakref
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+from sqlalchemy import func, update
+
+from . import models, tracing
+from .async_crud import get_session, update_session
+from .clients import process_photo_with_ml
+from .database import AsyncSessionLocal
+from .enums import SessionStatus
+from .metrics import observe_session_milestones, observe_stage
+from .reconciliation import reconcile
+from .schemas import SessionUpdate
+from .storage import photo_store
+
+
+logger = logging.getLogger(__name__)
+
+PHOTO_WORKERS = int(os.getenv("PHOTO_WORKERS", "4"))
+PHOTO_QUEUE_SIZE = int(os.getenv("PHOTO_QUEUE_SIZE", "100"))
+PHOTO_JOB_MAX_ATTEMPTS = int(os.getenv("PHOTO_JOB_MAX_ATTEMPTS", "3"))
+PHOTO_JOB_BACKOFF = float(os.getenv("PHOTO_JOB_BACKOFF", "1.0"))
+PHOTO_JOB_BACKOFF_MAX = float(os.getenv("PHOTO_JOB_BACKOFF_MAX", "30.0"))
+# A session is only recovered once it has sat in sent_to_ml this long, so jobs still running
+# in another worker process or replica are left alone. Keep it above the longest job.
+PHOTO_RECOVER_AFTER = float(os.getenv("PHOTO_RECOVER_AFTER", "600"))
+
+
+def sent_to_ml_update(photo_path: str, dispatched: bool = True) -> SessionUpdate:
+    """
+    Upload milestone. With `dispatched` the ML call follows right away (inline upload), so the
+    hand-off is stamped in the same commit; a queued job gets `sent_to_ml_at` when a worker calls ML.
+    """
+    now = datetime.utcnow()
+    return SessionUpdate(
+        photo=photo_path,
+        photo_uploaded_at=now,
+        sent_to_ml_at=now if dispatched else None,
+        status=SessionStatus.sent_to_ml,
+    )
+
+
+def processed_update(ml_response: Dict[str, Any], actual_tools: Optional[List[str]]) -> SessionUpdate:
+    """Final update with the detections and their reconciliation against the expected toolset."""
+    detected = ml_response.get("bboxes", [])
+    result = reconcile(actual_tools, detected)
+    return SessionUpdate(
+        processed_at=datetime.utcnow(),
+        detected_tools=detected,
+        status=SessionStatus.processed,
+        reconciliation_version=result.mapping_version,
+        missing_count=result.missing_count,
+        extra_count=result.extra_count,
+        duplicate_count=result.duplicate_count,
+        is_complete=result.is_complete,
+        reconciliation=result.details(),
+    )
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, (httpx.TransportError, OSError))
+
+
+class PhotoJobQueue:
+    """
+    Bounded queue of sessions waiting for ML processing, drained by a fixed pool of workers.
+
+    Workers open their own short-lived DB sessions, so no connection is held
+    while the ML call is in flight.
+    """
+
+    def __init__(
+        self,
+        workers: int = PHOTO_WORKERS,
+        maxsize: int = PHOTO_QUEUE_SIZE,
+        max_attempts: int = PHOTO_JOB_MAX_ATTEMPTS,
+        backoff: float = PHOTO_JOB_BACKOFF,
+        backoff_max: float = PHOTO_JOB_BACKOFF_MAX,
+        recover_after: float = PHOTO_RECOVER_AFTER,
+    ):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.recover_after = recover_after
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._recovery: Optional[asyncio.Task] = None
+        self._queued: Set[int] = set()
+        # Trace context of the request that queued each session, so the job joins its trace
+        self._trace_parents: Dict[int, Dict[str, str]] = {}
+        self._waiters: "weakref.WeakValueDictionary[int, asyncio.Event]" = weakref.WeakValueDictionary()
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        # In the background: with more stuck sessions than queue slots, put() waits on ML calls
+        self._recovery = asyncio.create_task(self._recover())
+        self._recovery.add_done_callback(self._log_recovery_error)
+
+    async def stop(self) -> None:
+        tasks = self._tasks + ([self._recovery] if self._recovery is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._recovery = None
+        self._queued.clear()
+        self._trace_parents.clear()
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+
+    async def submit(self, session_id: int) -> None:
+        if self._queue is None:
+            raise RuntimeError("photo job queue is not running")
+        if session_id in self._queued:
+            return
+        self._queued.add(session_id)
+        carrier = tracing.capture()
+        if carrier:
+            self._trace_parents[session_id] = carrier
+        await self._queue.put(session_id)
+
+    def subscribe(self, session_id: int) -> asyncio.Event:
+        """Event set when the session leaves `sent_to_ml`. Keep a reference while waiting."""
+        event = self._waiters.get(session_id)
+        if event is None:
+            event = asyncio.Event()
+            self._waiters[session_id] = event
+        return event
+
+    def _notify(self, session_id: int) -> None:
+        event = self._waiters.pop(session_id, None)
+        if event is not None:
+            event.set()
+
+    async def _recover(self) -> None:
+        """
+        Re-enqueue sessions left in `sent_to_ml` by a process that died.
+
+        One UPDATE claims them by moving `sent_to_ml_at` to now, so when several workers or
+        replicas start together each stuck session is recovered by exactly one of them.
+        """
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(models.Session)
+                .where(
+                    models.Session.status == SessionStatus.sent_to_ml.value,
+                    models.Session.photo.isnot(None),
+                    # Still queued somewhere (or lost from a queue) until a worker stamps sent_to_ml_at
+                    func.coalesce(models.Session.sent_to_ml_at, models.Session.photo_uploaded_at)
+                    < now - timedelta(seconds=self.recover_after),
+                )
+                .values(sent_to_ml_at=now)
+                .returning(models.Session.id)
+                .execution_options(synchronize_session=False)
+            )
+            session_ids = sorted(result.scalars().all())
+            await db.commit()
+        if session_ids:
+            logger.info("Recovering %d sessions stuck in sent_to_ml", len(session_ids))
+        for session_id in session_ids:
+            await self.submit(session_id)
+
+    @staticmethod
+    def _log_recovery_error(task: "asyncio.Task[None]") -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Recovering stuck photo jobs failed: %s", task.exception())
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            session_id = await self._queue.get()
+            try:
+                with tracing.start_trace("photo_job", self._trace_parents.pop(session_id, None), session_id=session_id):
+                    await self._process(session_id)
+            except Exception:
+                logger.exception("Photo job for session %s crashed", session_id)
+            finally:
+                self._queued.discard(session_id)
+                self._trace_parents.pop(session_id, None)
+                self._notify(session_id)
+                self._queue.task_done()
+
+    async def _process(self, session_id: int) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self._run_once(session_id)
+                return
+            except Exception as e:
+                if attempt == self.max_attempts or not _is_retryable(e):
+                    logger.warning("Photo job for session %s failed: %s", session_id, e)
+                    await self._mark_failed(session_id)
+                    return
+                delay = min(self.backoff_max, self.backoff * 2 ** (attempt - 1))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def _run_once(self, session_id: int) -> None:
+        async with AsyncSessionLocal() as db:
+            db_session = await get_session(db, session_id)
+            if db_session is None or db_session.status != SessionStatus.sent_to_ml.value:
+                return
+            photo_path = db_session.photo
+            if not photo_path:
+                return
+            # Leaving the queue: upload_to_ml covers the wait, ml_to_processed only the ML step
+            with observe_stage("db_update"):
+                await update_session(db, db_session, SessionUpdate(sent_to_ml_at=datetime.utcnow()))
+        photo_content = await photo_store.read(photo_path)
+        ml_response = await process_photo_with_ml(photo_content, os.path.basename(photo_path))
+
+        async with AsyncSessionLocal() as db:
+            db_session = await get_session(db, session_id)
+            if db_session is not None:
+                with observe_stage("db_update"):
+                    db_session = await update_session(db, db_session, processed_update(ml_response, db_session.actual_tools))
+                observe_session_milestones(db_session)
+
+    @staticmethod
+    async def _mark_failed(session_id: int) -> None:
+        async with AsyncSessionLocal() as db:
+            db_session = await get_session(db, session_id)
+            if db_session is not None:
+                with observe_stage("db_update"):
+                    await update_session(db, db_session, SessionUpdate(status=SessionStatus.failed))
+
+
+photo_jobs = PhotoJobQueue()
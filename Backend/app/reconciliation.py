@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import json
+import os
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+# Model class ids (ML/utils/data.yaml `names`) mapped onto the toolset vocabulary used in
+# orders' `actual_tools`. Append a new version instead of editing one in place: every
+# session stores the version it was reconciled with.
+TOOL_MAPPINGS: Dict[str, Dict[int, str]] = {
+    "v1": {
+        0: "Отвертка -",
+        1: "Ключ рожковыйнакидной",
+        2: "Бокорезы",
+        3: "Отвертка +",
+        4: "Отвертка на смещенный крест",
+        5: "Коловорот",
+        6: "Пассатижи контровочные",
+        7: "Пассатижи",
+        8: "Шэрница",
+        9: "Разводной ключ",
+        10: "Открывашка для банок с маслом",
+    },
+}
+
+TOOL_MAPPING_VERSION = os.getenv("TOOL_MAPPING_VERSION", "v1")
+# Optional JSON file {"version": "...", "classes": {"0": "name", ...}, "min_confidence": {"0": 0.6}}
+TOOL_MAPPING_FILE = os.getenv("TOOL_MAPPING_FILE")
+RECONCILE_MIN_CONFIDENCE = float(os.getenv("RECONCILE_MIN_CONFIDENCE", "0.5"))
+
+
+@dataclass(frozen=True)
+class ToolMapping:
+    """A versioned class_id -> tool name table with per-class confidence thresholds."""
+
+    version: str
+    names: Dict[int, str]
+    min_confidence: float = RECONCILE_MIN_CONFIDENCE
+    class_min_confidence: Dict[int, float] = field(default_factory=dict)
+
+    def threshold(self, class_id: int) -> float:
+        return self.class_min_confidence.get(class_id, self.min_confidence)
+
+
+@dataclass
+class Reconciliation:
+    mapping_version: str
+    missing: List[str]
+    extra: List[str]
+    duplicates: List[str]
+    unmapped_class_ids: List[int]
+    ignored_low_confidence: int
+
+    @property
+    def missing_count(self) -> int:
+        return len(self.missing)
+
+    @property
+    def extra_count(self) -> int:
+        return len(self.extra)
+
+    @property
+    def duplicate_count(self) -> int:
+        return len(self.duplicates)
+
+    @property
+    def is_complete(self) -> bool:
+        return not self.missing and not self.extra
+
+    def details(self) -> Dict[str, Any]:
+        return {
+            "missing": self.missing,
+            "extra": self.extra,
+            "duplicates": self.duplicates,
+            "unmapped_class_ids": self.unmapped_class_ids,
+            "ignored_low_confidence": self.ignored_low_confidence,
+        }
+
+
+def _load_mapping_file(path: str) -> ToolMapping:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return ToolMapping(
+        version=str(data["version"]),
+        names={int(k): v for k, v in data["classes"].items()},
+        min_confidence=float(data.get("default_min_confidence", RECONCILE_MIN_CONFIDENCE)),
+        class_min_confidence={int(k): float(v) for k, v in data.get("min_confidence", {}).items()},
+    )
+
+
+def _load_mapping() -> ToolMapping:
+    if TOOL_MAPPING_FILE:
+        return _load_mapping_file(TOOL_MAPPING_FILE)
+    if TOOL_MAPPING_VERSION not in TOOL_MAPPINGS:
+        raise ValueError(f"Unknown TOOL_MAPPING_VERSION {TOOL_MAPPING_VERSION!r}")
+    return ToolMapping(TOOL_MAPPING_VERSION, TOOL_MAPPINGS[TOOL_MAPPING_VERSION])
+
+
+# Built once at import; reconciliation itself is a couple of Counter operations
+current_mapping = _load_mapping()
+
+
+def reconcile(
+    actual_tools: Optional[List[str]],
+    detections: Optional[List[Dict[str, Any]]],
+    mapping: ToolMapping = current_mapping,
+) -> Reconciliation:
+    """
+    Compare the expected toolset with model detections.
+
+    Detections are mapped by `class_id`, not by the model's `class_name`. Those below the
+    class threshold are ignored. Names are compared as multisets:
+    - missing: expected tools with no detection;
+    - extra: detected tools that were not expected at all;
+    - duplicates: expected tools detected more times than listed.
+    """
+    expected = Counter(actual_tools or [])
+    detected: Counter = Counter()
+    unmapped = set()
+    ignored = 0
+    for det in detections or []:
+        try:
+            class_id = int(det["class_id"])
+            confidence = float(det.get("confidence", 1.0))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if confidence < mapping.threshold(class_id):
+            ignored += 1
+            continue
+        name = mapping.names.get(class_id)
+        if name is None:
+            unmapped.add(class_id)
+            continue
+        detected[name] += 1
+
+    missing = sorted((expected - detected).elements())
+    surplus = detected - expected
+    extra = sorted(name for name in surplus.elements() if name not in expected)
+    duplicates = sorted(name for name in surplus.elements() if name in expected)
+    return Reconciliation(
+        mapping_version=mapping.version,
+        missing=missing,
+        extra=extra,
+        duplicates=duplicates,
+        unmapped_class_ids=sorted(unmapped),
+        ignored_low_confidence=ignored,
+    )
@@ -1,110 +1,212 @@
 from __future__ import annotations
 
-import os
+import asyncio
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from sqlalchemy.orm import Session as OrmSession
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .crud import (
+from .async_crud import (
     create_session,
+    create_sessions,
     get_session,
+    get_session_statuses,
+    get_session_summaries,
     get_sessions,
     update_session,
 )
-from .database import get_db
-from .schemas import SessionCreate, SessionOut, SessionUpdate, OrderOut
+from .crud import next_cursor
+from .database import get_async_db
+from .schemas import (
+    SESSIONS_BATCH_MAX,
+    OrderOut,
+    SessionBulkCreate,
+    SessionCreate,
+    SessionFilter,
+    SessionOut,
+    SessionStatusOut,
+    SessionSummaryOut,
+    SessionUpdate,
+)
 from .clients import fetch_orders_by_employee, process_photo_with_ml
 from .enums import SessionStatus
+from .metrics import observe_session_milestones, observe_stage
+from .pipeline import photo_jobs, processed_update, sent_to_ml_update
+from .storage import photo_store
 
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
 
+def session_filter(
+    employee_id: Optional[str] = None,
+    order_id: Optional[str] = None,
+    session_status: Optional[SessionStatus] = Query(None, alias="status"),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    is_complete: Optional[bool] = None,
+) -> SessionFilter:
+    return SessionFilter(
+        employee_id=employee_id,
+        order_id=order_id,
+        status=session_status,
+        created_from=created_from,
+        created_to=created_to,
+        is_complete=is_complete,
+    )
+
+
 @router.get("/", response_model=List[SessionOut])
-def list_sessions(
+async def list_sessions(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
-    db: OrmSession = Depends(get_db),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    filters: SessionFilter = Depends(session_filter),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    return get_sessions(db, skip=skip, limit=limit)
+    try:
+        rows = await get_sessions(db, skip=skip, limit=limit, filters=filters, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    _set_next_cursor(response, rows, limit)
+    return rows
+
+
+@router.get("/summary", response_model=List[SessionSummaryOut])
+async def list_session_summaries(
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    filters: SessionFilter = Depends(session_filter),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Same listing as `GET /sessions/` without the actual_tools / detected_tools columns."""
+    try:
+        rows = await get_session_summaries(db, skip=skip, limit=limit, filters=filters, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    _set_next_cursor(response, rows, limit)
+    return rows
+
+
+# Declared before /{session_id} so "status" is not parsed as a session id
+@router.get("/status", response_model=List[SessionStatusOut])
+async def session_statuses(
+    ids: List[int] = Query(..., description="Session ids, e.g. ?ids=1&ids=2"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Status of many sessions in one query. Unknown ids are left out of the response."""
+    unique_ids = list(dict.fromkeys(ids))
+    if len(unique_ids) > SESSIONS_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {SESSIONS_BATCH_MAX} ids per request"
+        )
+    return await get_session_statuses(db, unique_ids)
+
+
+def _set_next_cursor(response: Response, rows: list, limit: int) -> None:
+    cursor = next_cursor(rows, limit)
+    if cursor is not None:
+        response.headers["X-Next-Cursor"] = cursor
 
 
 @router.get("/{session_id}", response_model=SessionOut)
-def read_session(session_id: int, db: OrmSession = Depends(get_db)):
-    db_obj = get_session(db, session_id)
+async def read_session(session_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_obj = await get_session(db, session_id)
     if not db_obj:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
     return db_obj
 
 
 @router.post("/", response_model=SessionOut, status_code=status.HTTP_201_CREATED)
-def create_session_endpoint(session_in: SessionCreate, db: OrmSession = Depends(get_db)):
-    return create_session(db, session_in)
+async def create_session_endpoint(session_in: SessionCreate, db: AsyncSession = Depends(get_async_db)):
+    return await create_session(db, session_in)
+
 
+@router.post("/bulk", response_model=List[SessionOut], status_code=status.HTTP_201_CREATED)
+async def create_sessions_endpoint(sessions_in: SessionBulkCreate, db: AsyncSession = Depends(get_async_db)):
+    """Create all sessions in one transaction; the response keeps the request order."""
+    return await create_sessions(db, sessions_in.sessions)
+
+
+
+@router.get("/{session_id}/wait", response_model=SessionOut)
+async def wait_session(
+    session_id: int,
+    timeout: float = Query(30.0, ge=0, le=120),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Long-poll until background ML processing of the session finishes or `timeout` expires."""
+    done = photo_jobs.subscribe(session_id)
+    db_session = await get_session(db, session_id)
+    if not db_session:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    if db_session.status != SessionStatus.sent_to_ml.value:
+        return db_session
+    # Return the connection to the pool while waiting
+    await db.commit()
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+    except asyncio.TimeoutError:
+        return db_session
+    await db.refresh(db_session)
+    return db_session
 
 
 @router.post("/{session_id}/upload-photo", response_model=SessionOut)
 async def upload_photo(
     session_id: int,
+    response: Response,
     photo: UploadFile = File(...),
-    db: OrmSession = Depends(get_db)
+    wait: bool = Query(True, description="Process with ML inline; false returns 202 and processes in the background"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload photo and process with ML service."""
     # Get session
-    db_session = get_session(db, session_id)
+    db_session = await get_session(db, session_id)
     if not db_session:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
     
     # Validate file type
     if not photo.content_type or not photo.content_type.startswith("image/"):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File must be an image")
-    
-    # Read photo content
-    photo_content = await photo.read()
 
-    # Save photo to storage (simple file system for now)
-    uploads_dir = "uploads"
-    os.makedirs(uploads_dir, exist_ok=True)
-    photo_path = f"{uploads_dir}/session_{session_id}_{photo.filename}"
-    
-    with open(photo_path, "wb") as f:
-        f.write(photo_content)
+    if not wait and photo_jobs.full():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Photo processing queue is full")
     
-    # Update session with photo_uploaded_at and status
-    now = datetime.utcnow()
-    update_data = SessionUpdate(
-        photo=photo_path,
-        photo_uploaded_at=now,
-        status=SessionStatus.photo_uploaded
-    )
-    db_session = update_session(db, db_session, update_data)
+    # Stream photo to content-addressed storage; the file stays pinned until the session points at it
+    previous_photo = db_session.photo
+    async with photo_store.save(photo) as stored:
+        # Inline uploads record the upload and the hand-off to ML in one commit
+        with observe_stage("db_update"):
+            db_session = await update_session(db, db_session, sent_to_ml_update(stored.path, dispatched=wait))
+    if previous_photo and previous_photo != stored.path:
+        await photo_store.release(db, previous_photo)
+
+    if not wait:
+        await photo_jobs.submit(session_id)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return db_session
     
-    # Update session with sent_to_ml_at before ML processing
-    now = datetime.utcnow()
-    update_data = SessionUpdate(
-        sent_to_ml_at=now,
-        status=SessionStatus.sent_to_ml
-    )
-    db_session = update_session(db, db_session, update_data)
-    
-    # Process with ML service
+    # Process with ML service, without holding a DB connection during the call
+    await db.commit()
     try:
+        photo_content = await photo_store.read(stored.path)
         ml_response = await process_photo_with_ml(photo_content, photo.filename or "photo.jpg")
-        detected_tools = ml_response.get("bboxes", [])
     except Exception as e:
+        # Same end state as an exhausted background job, so recovery does not pick it up again
+        with observe_stage("db_update"):
+            await update_session(db, db_session, SessionUpdate(status=SessionStatus.failed))
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"ML processing failed: {str(e)}")
     
     # Update session with processed_at and final status
-    now = datetime.utcnow()
-    update_data = SessionUpdate(
-        processed_at=now,
-        detected_tools=detected_tools,
-        status=SessionStatus.processed
-    )
-    
-    return update_session(db, db_session, update_data)
+    with observe_stage("db_update"):
+        db_session = await update_session(db, db_session, processed_update(ml_response, db_session.actual_tools))
+    observe_session_milestones(db_session)
+    return db_session
 
 
 orders_router = APIRouter(prefix="/orders", tags=["orders"])
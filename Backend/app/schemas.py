@@ -16,6 +16,14 @@ class SessionCreate(SessionBase):
     actual_tools: Optional[List[str]] = None  # temporary solution, will be removed later
 
 
+# Upper bound for one POST /sessions/bulk or GET /sessions/status call
+SESSIONS_BATCH_MAX = 1000
+
+
+class SessionBulkCreate(BaseModel):
+    sessions: List[SessionCreate] = Field(..., min_length=1, max_length=SESSIONS_BATCH_MAX)
+
+
 class SessionPhotoUpload(BaseModel):
     photo: Optional[str] = None
 
@@ -27,6 +35,12 @@ class SessionUpdate(BaseModel):
     photo_uploaded_at: Optional[datetime] = None
     sent_to_ml_at: Optional[datetime] = None
     processed_at: Optional[datetime] = None
+    reconciliation_version: Optional[str] = None
+    missing_count: Optional[int] = None
+    extra_count: Optional[int] = None
+    duplicate_count: Optional[int] = None
+    is_complete: Optional[bool] = None
+    reconciliation: Optional[Dict[str, Any]] = None
 
 
 class SessionOut(SessionBase):
@@ -40,11 +54,61 @@ class SessionOut(SessionBase):
     photo_uploaded_at: Optional[datetime] = None
     sent_to_ml_at: Optional[datetime] = None
     processed_at: Optional[datetime] = None
+    reconciliation_version: Optional[str] = None
+    missing_count: Optional[int] = None
+    extra_count: Optional[int] = None
+    duplicate_count: Optional[int] = None
+    is_complete: Optional[bool] = None
+    reconciliation: Optional[Dict[str, Any]] = None
 
     class Config:
         from_attributes = True
 
 
+class SessionSummaryOut(SessionBase):
+    """Listing row without the actual_tools / detected_tools payloads."""
+
+    id: int
+    created_at: datetime
+    updated_at: datetime
+    status: SessionStatus = Field(default=SessionStatus.pending_photo_upload)
+    photo: Optional[str] = None
+    photo_uploaded_at: Optional[datetime] = None
+    sent_to_ml_at: Optional[datetime] = None
+    processed_at: Optional[datetime] = None
+    missing_count: Optional[int] = None
+    extra_count: Optional[int] = None
+    duplicate_count: Optional[int] = None
+    is_complete: Optional[bool] = None
+
+    class Config:
+        from_attributes = True
+
+
+class SessionStatusOut(BaseModel):
+    """Progress of one session, as returned by the batch status lookup."""
+
+    id: int
+    status: SessionStatus
+    photo_uploaded_at: Optional[datetime] = None
+    sent_to_ml_at: Optional[datetime] = None
+    processed_at: Optional[datetime] = None
+    is_complete: Optional[bool] = None
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class SessionFilter(BaseModel):
+    employee_id: Optional[str] = None
+    order_id: Optional[str] = None
+    status: Optional[SessionStatus] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    is_complete: Optional[bool] = None
+
+
 class OrderOut(BaseModel):
     order_id: str
     created_at: datetime
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, BinaryIO, Dict, NamedTuple
+
+from fastapi import UploadFile
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from . import models
+from .metrics import observe_stage
+
+
+UPLOADS_DIR = os.getenv("UPLOADS_DIR", "uploads")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+
+class StoredPhoto(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+    created: bool  # False when identical content was already stored
+
+
+class PhotoStore:
+    """
+    Content-addressed photo storage: files live at `<root>/ab/cd/<sha256>`.
+
+    Uploads are streamed to a temp file in chunks and hashed on the fly, so memory
+    stays flat regardless of image size; identical content ends up as a single file.
+    Files are referenced from `Session.photo` and removed once no session points at them.
+
+    A saved file is pinned until the caller has committed the session that references it,
+    and placing and deleting a file are serialized per path. Otherwise `release()` could
+    count zero references and delete a file that a concurrent upload of the same content
+    has just reused but not committed yet. The pins live in this process; with several
+    workers sharing UPLOADS_DIR, the same race remains between processes.
+    """
+
+    def __init__(self, root: str = UPLOADS_DIR, chunk_size: int = UPLOAD_CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._pins: Dict[str, int] = {}
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def _lock(self, path: str) -> asyncio.Lock:
+        lock = self._locks.get(path)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[path] = lock
+        return lock
+
+    @asynccontextmanager
+    async def save(self, upload: UploadFile) -> AsyncIterator[StoredPhoto]:
+        """
+        Store the upload; the file cannot be released until the block exits, so commit
+        the session that references it inside the block.
+        """
+        with observe_stage("upload_write"):
+            stored = await self._save(upload)
+        try:
+            yield stored
+        finally:
+            self._pins[stored.path] -= 1
+            if not self._pins[stored.path]:
+                del self._pins[stored.path]
+
+    async def _save(self, upload: UploadFile) -> StoredPhoto:
+        tmp_dir = os.path.join(self.root, "tmp")
+        fd, tmp_path = await run_in_threadpool(self._mkstemp, tmp_dir)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = await upload.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    await run_in_threadpool(self._write_chunk, f, hasher, chunk)
+            digest = hasher.hexdigest()
+            path = self.path_for(digest)
+            lock = self._lock(path)
+            async with lock:
+                created = await run_in_threadpool(self._commit, tmp_path, path)
+                self._pins[path] = self._pins.get(path, 0) + 1
+        except BaseException:
+            await run_in_threadpool(self._remove, tmp_path)
+            raise
+        return StoredPhoto(path=path, sha256=digest, size=size, created=created)
+
+    async def read(self, path: str) -> bytes:
+        with observe_stage("photo_read"):
+            return await run_in_threadpool(self._read, path)
+
+    async def release(self, db: AsyncSession, path: str) -> bool:
+        """Delete the file if no session references it and no upload holds it."""
+        lock = self._lock(path)
+        async with lock:
+            if self._pins.get(path):
+                return False
+            refs = await db.scalar(select(func.count()).where(models.Session.photo == path))
+            if refs:
+                return False
+            return await run_in_threadpool(self._remove, path)
+
+    @staticmethod
+    def _mkstemp(tmp_dir: str):
+        os.makedirs(tmp_dir, exist_ok=True)
+        return tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+
+    @staticmethod
+    def _write_chunk(f: BinaryIO, hasher, chunk: bytes) -> None:
+        hasher.update(chunk)
+        f.write(chunk)
+
+    @staticmethod
+    def _commit(tmp_path: str, path: str) -> bool:
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return True
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+
+photo_store = PhotoStore()
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import logging
+import os
+from contextlib import nullcontext
+from typing import Any, ContextManager, Dict, MutableMapping, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# none | otlp | file | console. Needs `opentelemetry-sdk` (+ `opentelemetry-exporter-otlp-proto-http` for otlp)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+# Share of new traces that are recorded; an incoming sampled traceparent is always followed
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "0.05"))
+TRACING_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "backend")
+
+# Set by setup_tracing(); while it is None every helper below is a no-op
+_tracer: Any = None
+_provider: Any = None
+
+
+def _create_exporter(kind: str) -> Any:
+    if kind == "otlp":
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter()
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    if kind == "file":
+        # One JSON span per line, appended
+        out = open(TRACING_FILE, "a", buffering=1, encoding="utf-8")
+        return ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + os.linesep)
+    if kind == "console":
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER {kind!r}")
+
+
+def setup_tracing(service_name: str = TRACING_SERVICE_NAME) -> bool:
+    """Install the tracer provider for this process. Returns False when tracing stays off."""
+    global _tracer, _provider
+    if TRACING_EXPORTER == "none" or _tracer is not None:
+        return _tracer is not None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+        exporter = _create_exporter(TRACING_EXPORTER)
+    except ImportError as e:
+        logger.warning("TRACING_EXPORTER=%s but OpenTelemetry is not installed (%s); tracing disabled", TRACING_EXPORTER, e)
+        return False
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO)),
+    )
+    # Spans are exported from a background thread, off the request path
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    _tracer = trace.get_tracer("backend")
+    return True
+
+
+def shutdown_tracing() -> None:
+    """Flush pending spans."""
+    global _tracer, _provider
+    if _provider is not None:
+        _provider.shutdown()
+    _tracer = None
+    _provider = None
+
+
+def span(name: str, **attributes: Any) -> ContextManager[Any]:
+    """
+    Child span of the current span. Outside a sampled trace nothing is created,
+    so instrumented stages cost one context lookup when the request is not recorded.
+    """
+    if _tracer is None:
+        return nullcontext()
+    from opentelemetry import trace
+
+    if not trace.get_current_span().is_recording():
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes or None)
+
+
+def start_trace(
+    name: str, carrier: Optional[Dict[str, str]] = None, server: bool = False, **attributes: Any
+) -> ContextManager[Any]:
+    """
+    Entry span continuing the W3C trace context in `carrier` (incoming headers or
+    capture() output), or starting a new trace subject to sampling.
+    """
+    if _tracer is None:
+        return nullcontext()
+    from opentelemetry import trace
+    from opentelemetry.propagate import extract
+
+    return _tracer.start_as_current_span(
+        name,
+        context=extract(carrier or {}),
+        kind=trace.SpanKind.SERVER if server else trace.SpanKind.INTERNAL,
+        attributes=attributes or None,
+    )
+
+
+def inject(headers: MutableMapping[str, str]) -> None:
+    """Add `traceparent`/`tracestate` for the current span to outgoing headers."""
+    if _tracer is None:
+        return
+    from opentelemetry.propagate import inject as otel_inject
+
+    otel_inject(headers)
+
+
+def capture() -> Optional[Dict[str, str]]:
+    """Current trace context as a header dict, for work handed off to a background task."""
+    if _tracer is None:
+        return None
+    carrier: Dict[str, str] = {}
+    inject(carrier)
+    return carrier or None
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware opening a server span per request from the incoming traceparent."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or _tracer is None:
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        status_code = 500
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with start_trace(f"{scope['method']} {scope['path']}", headers, server=True) as current:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                if current.is_recording():
+                    route = scope.get("route")
+                    template = getattr(route, "path", None)
+                    if template:
+                        # Route templates keep span names low-cardinality
+                        current.update_name(f"{scope['method']} {template}")
+                        current.set_attribute("http.route", template)
+                    current.set_attribute("http.request.method", scope["method"])
+                    current.set_attribute("http.response.status_code", status_code)
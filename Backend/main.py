@@ -1,16 +1,36 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware   
 
-from app.database import Base, engine
+from app.clients import close_clients, init_clients
+from app.database import Base, async_engine, engine
+from app.metrics import MetricsMiddleware, render_metrics
+from app.tracing import TracingMiddleware, setup_tracing, shutdown_tracing
+from app.pipeline import photo_jobs
 from app.routers import router as sessions_router
 from app.routers import orders_router
 from fastapi.middleware.cors import CORSMiddleware
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_tracing()
+    await init_clients()
+    await photo_jobs.start()
+    try:
+        yield
+    finally:
+        await photo_jobs.stop()
+        await close_clients()
+        await async_engine.dispose()
+        shutdown_tracing()
+
+
 def create_app() -> FastAPI:
     Base.metadata.create_all(bind=engine)
 
-    app = FastAPI(title="Hackathon Backend", version="0.1.0")
+    app = FastAPI(title="Hackathon Backend", version="0.1.0", lifespan=lifespan)
     app.include_router(sessions_router)
     app.include_router(orders_router)
     
@@ -32,7 +52,16 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics() -> Response:
+        payload, content_type = render_metrics(photo_queue_depth=photo_jobs.depth())
+        return Response(payload, media_type=content_type)
+
     return app
 
 app = create_app()
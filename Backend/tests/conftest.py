@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+
+# Configure the app for an isolated SQLite database before any app module is imported
+_tmp = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp, 'test.db')}")
+os.environ.setdefault("UPLOADS_DIR", os.path.join(_tmp, "uploads"))
+os.environ.setdefault("ML_SERVICE_URL", "mock")
+os.environ.setdefault("ORDERS_SERVICE_URL", "mock")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def tables():
+    from app.database import Base, engine
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+@pytest.fixture
+def client(tables):
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import List
+
+import pytest
+
+from app.cache import InMemoryBackend, SWRCache
+
+
+class _Loader:
+    """Counts calls; the value is the call number, failing calls raise instead."""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls: List[str] = []
+
+    async def __call__(self, key: str) -> int:
+        self.calls.append(key)
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return len(self.calls)
+
+
+async def _stale_cache(loader: _Loader, value: int) -> SWRCache[int]:
+    """A cache holding `value` for "k" past its ttl but inside the stale window."""
+    cache: SWRCache[int] = SWRCache(loader, ttl=10.0, stale_ttl=60.0, backend=InMemoryBackend())
+    await cache.backend.set("k", value, time.time() - 30.0, 70.0)
+    return cache
+
+
+def test_concurrent_misses_share_one_load():
+    loader = _Loader(delay=0.05)
+    cache: SWRCache[int] = SWRCache(loader, ttl=10.0)
+
+    async def scenario():
+        values = await asyncio.gather(*(cache.get("k") for _ in range(5)))
+        assert values == [1] * 5
+        assert loader.calls == ["k"]
+        # Fresh entry: served without another load
+        assert await cache.get("k") == 1
+        assert cache.stats() == {"hits": 1, "stale_hits": 0, "misses": 5, "backend_errors": 0}
+
+    asyncio.run(scenario())
+
+
+def test_stale_entry_is_served_while_one_refresh_runs():
+    loader = _Loader(delay=0.05)
+
+    async def scenario():
+        cache = await _stale_cache(loader, 0)
+        assert await asyncio.gather(cache.get("k"), cache.get("k")) == [0, 0]
+        await asyncio.sleep(0.1)
+        assert loader.calls == ["k"]
+        assert await cache.get("k") == 1
+        assert cache.stats() == {"hits": 1, "stale_hits": 2, "misses": 0, "backend_errors": 0}
+
+    asyncio.run(scenario())
+
+
+def test_failed_refresh_keeps_serving_the_stale_value(caplog):
+    loader = _Loader(fail=True)
+
+    async def scenario():
+        cache = await _stale_cache(loader, 0)
+        assert await cache.get("k") == 0
+        await asyncio.sleep(0.01)
+        # The failed refresh left the entry alone, so the next read retries it
+        assert await cache.get("k") == 0
+        await asyncio.sleep(0.01)
+        assert len(loader.calls) == 2
+        assert cache.stats() == {"hits": 0, "stale_hits": 2, "misses": 0, "backend_errors": 0}
+
+    asyncio.run(scenario())
+    assert "Background cache refresh failed" in caplog.text
+
+
+def test_failed_load_on_miss_raises_and_is_not_cached():
+    loader = _Loader(fail=True)
+    cache: SWRCache[int] = SWRCache(loader, ttl=10.0)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await cache.get("k")
+        loader.fail = False
+        assert await cache.get("k") == 2
+
+    asyncio.run(scenario())
+
+
+class _BrokenBackend:
+    """Shared cache that is down: every call raises."""
+
+    async def get(self, key: str):
+        raise ConnectionError("redis unreachable")
+
+    async def set(self, key: str, value, stored_at: float, ttl: float) -> None:
+        raise ConnectionError("redis unreachable")
+
+
+def test_unavailable_backend_falls_back_to_the_loader(caplog):
+    loader = _Loader()
+    cache: SWRCache[int] = SWRCache(loader, ttl=10.0, backend=_BrokenBackend())
+
+    async def scenario():
+        assert await cache.get("k") == 1
+        assert await cache.get("k") == 2
+        assert cache.stats()["backend_errors"] == 4
+
+    asyncio.run(scenario())
+    assert "Cache backend read failed" in caplog.text
+    assert "Cache backend write failed" in caplog.text
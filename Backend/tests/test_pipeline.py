@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import asyncio
+import io
+from datetime import datetime, timedelta
+from typing import List
+
+from app import models, routers
+from app.database import AsyncSessionLocal, async_engine
+from app.enums import SessionStatus
+from app.pipeline import PhotoJobQueue
+
+
+async def _add_sent(age: timedelta, queued: bool = False) -> int:
+    """A session in sent_to_ml since `age` ago; `queued` ones never reached a worker."""
+    async with AsyncSessionLocal() as db:
+        row = models.Session(
+            employee_id="E1",
+            order_id="O1",
+            status=SessionStatus.sent_to_ml.value,
+            photo="uploads/ab/cd/abcd",
+            photo_uploaded_at=datetime.utcnow() - age,
+            sent_to_ml_at=None if queued else datetime.utcnow() - age,
+        )
+        db.add(row)
+        await db.commit()
+        return row.id
+
+
+class _BlockingQueue(PhotoJobQueue):
+    """Jobs record their session and then wait, like a slow ML call."""
+
+    def __init__(self, **kwargs):
+        super().__init__(workers=1, maxsize=1, **kwargs)
+        self.release = asyncio.Event()
+        self.processed: List[int] = []
+
+    async def _process(self, session_id: int) -> None:
+        self.processed.append(session_id)
+        await self.release.wait()
+
+
+def test_recovery_runs_in_background_and_claims_each_session_once(tables):
+    async def scenario():
+        stuck = [await _add_sent(timedelta(hours=1)) for _ in range(2)]
+        stuck.append(await _add_sent(timedelta(hours=1), queued=True))
+        await _add_sent(timedelta(seconds=5))  # still running elsewhere
+        await _add_sent(timedelta(seconds=5), queued=True)  # still queued elsewhere
+
+        replicas = [_BlockingQueue(recover_after=600) for _ in range(2)]
+        # More stuck sessions than queue slots and a blocked worker: start() still returns at once
+        for queue in replicas:
+            await asyncio.wait_for(queue.start(), 1)
+        await asyncio.sleep(0.1)
+        for queue in replicas:
+            queue.release.set()
+        for _ in range(50):
+            if sum(len(queue.processed) for queue in replicas) >= len(stuck):
+                break
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.05)
+        for queue in replicas:
+            await queue.stop()
+        # Both replicas recovered at the same time, yet each stuck session ran exactly once
+        assert sorted(replicas[0].processed + replicas[1].processed) == stuck
+        # Pooled connections belong to this event loop
+        await async_engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_failed_inline_ml_call_marks_session_failed(client, monkeypatch):
+    async def ml_down(content: bytes, filename: str):
+        raise RuntimeError("ml is down")
+
+    monkeypatch.setattr(routers, "process_photo_with_ml", ml_down)
+    session_id = client.post("/sessions/", json={"employee_id": "E1", "order_id": "O1"}).json()["id"]
+    resp = client.post(
+        f"/sessions/{session_id}/upload-photo",
+        files={"photo": ("p.jpg", io.BytesIO(b"photo"), "image/jpeg")},
+    )
+    assert resp.status_code == 500
+    assert client.get(f"/sessions/{session_id}").json()["status"] == SessionStatus.failed.value
+
+
+def test_queued_upload_is_sent_to_ml_when_a_worker_picks_it_up(client):
+    session_id = client.post("/sessions/", json={"employee_id": "E1", "order_id": "O1"}).json()["id"]
+    resp = client.post(
+        f"/sessions/{session_id}/upload-photo",
+        params={"wait": "false"},
+        files={"photo": ("p.jpg", io.BytesIO(b"queued photo"), "image/jpeg")},
+    )
+    assert resp.status_code == 202
+    assert resp.json()["sent_to_ml_at"] is None
+    session = client.get(f"/sessions/{session_id}/wait", params={"timeout": 5}).json()
+    assert session["status"] == SessionStatus.processed.value
+    assert session["photo_uploaded_at"] < session["sent_to_ml_at"] <= session["processed_at"]
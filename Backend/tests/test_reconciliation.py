@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from app.reconciliation import ToolMapping, reconcile
+
+
+MAPPING = ToolMapping(
+    version="test",
+    names={0: "Отвертка -", 1: "Бокорезы", 2: "Пассатижи"},
+    min_confidence=0.5,
+    class_min_confidence={2: 0.8},
+)
+
+
+def _det(class_id: int, confidence: float = 0.9, class_name: str = "ignored") -> dict:
+    return {"class_id": class_id, "confidence": confidence, "class_name": class_name}
+
+
+def test_exact_match_is_complete():
+    result = reconcile(["Отвертка -", "Бокорезы"], [_det(1), _det(0)], MAPPING)
+    assert result.is_complete
+    assert result.mapping_version == "test"
+    assert (result.missing, result.extra, result.duplicates) == ([], [], [])
+
+
+def test_missing_extra_and_duplicates_are_counted_as_multisets():
+    result = reconcile(
+        ["Отвертка -", "Отвертка -", "Бокорезы"],
+        [_det(0), _det(1), _det(1), _det(2)],
+        MAPPING,
+    )
+    assert result.missing == ["Отвертка -"]
+    assert result.extra == ["Пассатижи"]
+    assert result.duplicates == ["Бокорезы"]
+    assert not result.is_complete
+    # A duplicate of an expected tool alone does not make the set incomplete
+    assert reconcile(["Бокорезы"], [_det(1), _det(1)], MAPPING).is_complete
+
+
+def test_names_come_from_class_id_not_class_name():
+    result = reconcile(["Бокорезы"], [_det(1, class_name="Отвертка -")], MAPPING)
+    assert result.is_complete
+
+
+def test_per_class_thresholds_and_unmapped_ids():
+    result = reconcile(
+        ["Пассатижи"],
+        [_det(2, confidence=0.7), _det(0, confidence=0.4), _det(7), {"class_id": "x"}],
+        MAPPING,
+    )
+    assert result.missing == ["Пассатижи"]
+    assert result.ignored_low_confidence == 2
+    assert result.unmapped_class_ids == [7]
+    assert result.extra == []
+
+
+def test_empty_inputs():
+    result = reconcile(None, None, MAPPING)
+    assert result.is_complete
+    assert result.details()["ignored_low_confidence"] == 0
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import os
+
+from fastapi import UploadFile
+
+from app.storage import PhotoStore
+
+
+class _NoRefs:
+    """Stand-in DB session: no Session row references any photo."""
+
+    async def scalar(self, stmt):
+        return 0
+
+
+def _upload(content: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename="p.jpg")
+
+
+def test_release_keeps_file_reused_by_uncommitted_upload(tmp_path):
+    store = PhotoStore(root=str(tmp_path))
+
+    async def scenario():
+        async with store.save(_upload(b"photo")) as first:
+            pass
+        # A second upload of the same content reuses the file but has not committed yet
+        async with store.save(_upload(b"photo")) as second:
+            assert not second.created and second.path == first.path
+            assert not await store.release(_NoRefs(), first.path)
+            assert os.path.exists(first.path)
+        # Once the upload is done, an unreferenced file can go
+        assert await store.release(_NoRefs(), first.path)
+        assert not os.path.exists(first.path)
+
+    asyncio.run(scenario())
+
+
+def test_save_after_release_writes_the_file_again(tmp_path):
+    store = PhotoStore(root=str(tmp_path))
+
+    async def scenario():
+        async with store.save(_upload(b"photo")) as first:
+            pass
+        assert await store.release(_NoRefs(), first.path)
+        async with store.save(_upload(b"photo")) as again:
+            assert again.created
+            assert await store.read(again.path) == b"photo"
+
+    asyncio.run(scenario())
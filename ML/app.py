@@ -1,17 +1,142 @@
-import io
+import os
+import threading
+from contextlib import asynccontextmanager
 from typing import List, Dict, Any
 
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Response
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from PIL import Image
-import numpy as np
-from ultralytics import YOLO
 from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
+import inference
+import tracing
+from errors import ImageDecodeError, ServiceUnavailable
+from batching import MicroBatcher
+from inference_cache import InferenceCache
+from metrics import INFERENCE_IN_FLIGHT, MetricsMiddleware, observe_batch, observe_timings, render_metrics
+from tiling import TileConfig, predict_tiled
+from tracing import TracingMiddleware, setup_tracing, shutdown_tracing
+from workers import InferencePool, default_threads
 
-app = FastAPI(title="YOLO detect API")
+
+# Загружаем модель при старте (маленькая модель yolov8n)
+# Можно заменить на 'yolov8s.pt' или путь к своей модели.
+# MODEL_FORMAT выбирает бэкенд: pt (PyTorch), onnx (ONNX Runtime), openvino, openvino_int8;
+# MODEL_PATH переопределяет путь целиком
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "pt")
+MODEL_PATH = os.getenv("MODEL_PATH") or inference.model_path_for(MODEL_FORMAT)
+# Параметры по умолчанию
+DEFAULT_CONF = 0.25
+DEFAULT_IMGSZ = 640
+
+# Процессы инференса: у каждого своя модель и свои потоки torch.
+# ML_WORKERS=0 — модель в процессе сервера, как раньше
+ML_WORKERS = int(os.getenv("ML_WORKERS", "0"))
+ML_WORKER_THREADS = int(os.getenv("ML_WORKER_THREADS", "0")) or default_threads(max(1, ML_WORKERS))
+ML_WARMUP = os.getenv("ML_WARMUP", "1") == "1"
+ML_DRAIN_TIMEOUT = float(os.getenv("ML_DRAIN_TIMEOUT", "30"))
+
+# Крупные JPEG декодируются сразу в 1/2..1/8 размера, если длинная сторона всё равно больше imgsz
+DECODE_REDUCED = os.getenv("DECODE_REDUCED", "1") == "1"
+
+# Микро-батчинг: конкурентные запросы собираются в окно и идут в модель одним вызовом.
+# BATCH_MAX_SIZE=1 фактически отключает объединение.
+BATCHING_ENABLED = os.getenv("BATCHING_ENABLED", "1") == "1"
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+# Тайловый режим для фото высокого разрешения: кадр режется на перекрывающиеся тайлы,
+# они идут в модель одним батчем, дубли на стыках убирает NMS.
+# Включается полем формы tiled=true; TILED_DEFAULT=1 делает его режимом по умолчанию
+TILED_DEFAULT = os.getenv("TILED_DEFAULT", "0") == "1"
+TILE_CONFIG = TileConfig(
+    tile_size=int(os.getenv("TILE_SIZE", "1280")),
+    overlap=float(os.getenv("TILE_OVERLAP", "0.2")),
+    max_tiles=int(os.getenv("TILE_MAX_TILES", "16")),
+    iou_thr=float(os.getenv("TILE_NMS_IOU", "0.5")),
+    ios_thr=float(os.getenv("TILE_MERGE_IOS", "0.7")),
+    include_full=os.getenv("TILE_INCLUDE_FULL", "1") == "1",
+)
+
+# Кэш результатов по хэшу изображения; INFERENCE_CACHE_SIZE=0 отключает
+INFERENCE_CACHE_SIZE = int(os.getenv("INFERENCE_CACHE_SIZE", "1024"))
+INFERENCE_CACHE_MAX_MB = float(os.getenv("INFERENCE_CACHE_MAX_MB", "64"))
+INFERENCE_CACHE_TTL = float(os.getenv("INFERENCE_CACHE_TTL", "3600"))
+
+# Модель процесса сервера (режим ML_WORKERS=0); загружается в lifespan.
+# Объект YOLO не рассчитан на параллельные predict, поэтому вызовы идут под замком
+model = None
+_model_lock = threading.Lock()
+
+pool = (
+    InferencePool(
+        MODEL_PATH, ML_WORKERS, ML_WORKER_THREADS, DEFAULT_IMGSZ,
+        reduced_decode=DECODE_REDUCED, on_timings=observe_timings,
+    )
+    if ML_WORKERS > 0 else None
+)
+
+inference_cache = InferenceCache(
+    MODEL_PATH,
+    max_entries=INFERENCE_CACHE_SIZE,
+    max_bytes=int(INFERENCE_CACHE_MAX_MB * 1024 * 1024),
+    ttl=INFERENCE_CACHE_TTL,
+)
+
+
+def _load_model():
+    # в процессе сервера потоки torch ограничиваем, только если это задано явно
+    if os.getenv("ML_WORKER_THREADS"):
+        import torch
+
+        torch.set_num_threads(ML_WORKER_THREADS)
+    loaded = inference.load_model(MODEL_PATH)
+    if ML_WARMUP:
+        inference.warmup(loaded, DEFAULT_IMGSZ)
+    return loaded
+
+
+async def _run_batch(items: List[Any], conf: float, imgsz: int) -> List[Any]:
+    # в режиме пула items — байты, декодируются в воркере; иначе уже DecodedImage
+    if pool is not None:
+        return await pool.predict(items, conf, imgsz)
+    return await run_in_threadpool(_predict_batch, items, conf, imgsz)
+
+
+batcher = MicroBatcher(
+    _run_batch,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_concurrent_batches=max(1, ML_WORKERS),
+    on_batch=observe_batch,
+)
+
+_state = {"ready": False, "draining": False}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global model
+    setup_tracing()
+    if pool is not None:
+        await pool.start()
+    else:
+        model = await run_in_threadpool(_load_model)
+    if BATCHING_ENABLED:
+        await batcher.start()
+    _state["ready"] = True
+    yield
+    # uvicorn уже не принимает новые соединения; дорабатываем то, что в очереди и в воркерах
+    _state["ready"] = False
+    _state["draining"] = True
+    await batcher.stop(drain_timeout=ML_DRAIN_TIMEOUT)
+    if pool is not None:
+        await pool.stop(ML_DRAIN_TIMEOUT)
+    shutdown_tracing()
+
+
+app = FastAPI(title="YOLO detect API", lifespan=lifespan)
 # Set all CORS enabled origins
 origins = [
     # Local
@@ -29,16 +154,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Загружаем модель при старте (маленькая модель yolov8n)
-# Можно заменить на 'yolov8s.pt' или путь к своей модели
-MODEL_PATH = "best.pt"
-# Параметры по умолчанию
-DEFAULT_CONF = 0.25
-DEFAULT_IMGSZ = 640
-
-# Загружаем модель (это блокирующая операция)
-model = YOLO(MODEL_PATH)
+app.add_middleware(TracingMiddleware)
+# последним, чтобы время считалось снаружи CORS и всего стека
+app.add_middleware(MetricsMiddleware)
 
 
 class BBox(BaseModel):
@@ -51,68 +169,76 @@ class BBox(BaseModel):
     class_name: str
 
 
+def _decode(img_bytes: bytes, imgsz: int) -> inference.DecodedImage:
+    timings: Dict[str, float] = {}
+    with inference.timed(timings, "decode"):
+        image = inference.decode_image(img_bytes, imgsz if DECODE_REDUCED else None)
+    observe_timings(timings)
+    return image
+
+
+def _predict_batch(images: List[inference.DecodedImage], conf: float, imgsz: int) -> List[List[Dict[str, Any]]]:
+    """
+    Blocking prediction для батча в процессе сервера.
+    """
+    timings: Dict[str, float] = {}
+    try:
+        with inference.timed(timings, "lock_wait"):
+            _model_lock.acquire()
+        try:
+            return inference.predict_batch(model, images, conf, imgsz, timings)
+        finally:
+            _model_lock.release()
+    finally:
+        observe_timings(timings)
+
+
 def _predict_from_bytes(img_bytes: bytes, conf: float = DEFAULT_CONF, imgsz: int = DEFAULT_IMGSZ) -> List[Dict[str, Any]]:
     """
     Blocking prediction: принимает байты изображения, возвращает список bbox.
     """
+    img = _decode(img_bytes, imgsz)
+    results = _predict_batch([img], conf, imgsz)
+    # results[0] соответствует первому (и единственному) изображению
+    return results[0] if results else []
+
+
+def _predict_tiled_from_bytes(img_bytes: bytes, conf: float, imgsz: int) -> List[Dict[str, Any]]:
+    timings: Dict[str, float] = {}
     try:
-        img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-    except Exception as e:
-        raise RuntimeError(f"can't open image: {e}")
+        # тайлам нужен полный кадр, уменьшенное декодирование здесь не используем
+        with inference.timed(timings, "decode"):
+            image = inference.decode_image(img_bytes)
+        with inference.timed(timings, "lock_wait"):
+            _model_lock.acquire()
+        try:
+            return predict_tiled(model, image, conf, imgsz, TILE_CONFIG, timings)
+        finally:
+            _model_lock.release()
+    finally:
+        observe_timings(timings)
 
-    # ultralytics поддерживает PIL.Image напрямую
-    results = model.predict(img, conf=conf, imgsz=imgsz)  # возвращает список Results (обычно длина 1)
-    out = []
-    # results[0] соответствует первому (и единственному) изображению
-    if len(results) == 0:
-        return out
-
-    r = results[0]
-    # r.boxes содержит координаты в формате xyxy
-    # .xyxy, .conf, .cls
-    boxes = getattr(r.boxes, "xyxy", None)
-    confs = getattr(r.boxes, "conf", None)
-    classes = getattr(r.boxes, "cls", None)
-
-    names = getattr(model, "names", None) or {}
-
-    if boxes is None:
-        return out
-
-    # boxes is a tensor-like; convert to numpy
-    boxes_np = boxes.cpu().numpy() if hasattr(boxes, "cpu") else np.array(boxes)
-    confs_np = confs.cpu().numpy() if hasattr(confs, "cpu") else np.array(confs)
-    classes_np = classes.cpu().numpy() if hasattr(classes, "cpu") else np.array(classes)
-
-    for i in range(len(boxes_np)):
-        x1, y1, x2, y2 = boxes_np[i].tolist()
-        confv = float(confs_np[i])
-        cls_id = int(classes_np[i])
-        cls_name = str(names.get(cls_id, str(cls_id)))
-        out.append({
-            "x1": float(x1),
-            "y1": float(y1),
-            "x2": float(x2),
-            "y2": float(y2),
-            "confidence": confv,
-            "class_id": cls_id,
-            "class_name": cls_name
-        })
-
-    return out
+
+async def _predict_in_pool(img_bytes: bytes, conf: float, imgsz: int) -> List[Dict[str, Any]]:
+    result = (await pool.predict([img_bytes], conf, imgsz))[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
 
 
 @app.post("/analyze", response_class=JSONResponse)
 async def detect(
     file: UploadFile = File(...),
     conf: float = Form(DEFAULT_CONF),
-    imgsz: int = Form(DEFAULT_IMGSZ)
+    imgsz: int = Form(DEFAULT_IMGSZ),
+    tiled: bool = Form(TILED_DEFAULT),
 ):
     """
     Принимает multipart/form-data:
       - file: бинарное изображение
       - conf (optional, form field): confidence threshold (float)
       - imgsz (optional, form field): размер для ресайза модели (int)
+      - tiled (optional, form field): тайловый инференс для мелких объектов на больших фото
     Возвращает JSON: {"bboxes": [ {x1,y1,x2,y2,confidence,class_id,class_name}, ... ] }
     """
     # читаем байты (async I/O)
@@ -124,12 +250,97 @@ async def detect(
     if not img_bytes:
         raise HTTPException(status_code=400, detail="empty file")
 
-    # модель блокирует, поэтому выполняем в threadpool
+    cache_key = None
+    if inference_cache.enabled:
+        variant = f"tiled:{TILE_CONFIG.tile_size}:{TILE_CONFIG.overlap:g}:{TILE_CONFIG.max_tiles}" if tiled else ""
+        cache_key = await run_in_threadpool(inference_cache.make_key, img_bytes, float(conf), int(imgsz), variant)
+        cached = inference_cache.get(cache_key)
+        if cached is not None:
+            return {"bboxes": cached}
+
+    if not _state["ready"]:
+        raise HTTPException(status_code=503, detail="model is not ready")
+
+    # модель блокирует, поэтому выполняем в threadpool или в процессах-воркерах;
+    # при включённом батчинге декодируем здесь, а сам predict делает батчер
     try:
-        bboxes = await run_in_threadpool(_predict_from_bytes, img_bytes, float(conf), int(imgsz))
-    except RuntimeError as e:
+        with INFERENCE_IN_FLIGHT.track_inprogress(), tracing.span("inference", tiled=tiled, workers=ML_WORKERS):
+            bboxes = await _infer(img_bytes, float(conf), int(imgsz), tiled)
+    except ImageDecodeError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except ServiceUnavailable as e:
+        # остановка или перезапуск сервиса: Backend повторит запрос
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"prediction failed: {e}")
 
+    if cache_key is not None:
+        inference_cache.put(cache_key, bboxes)
     return {"bboxes": bboxes}
+
+
+async def _infer(img_bytes: bytes, conf: float, imgsz: int, tiled: bool) -> List[Dict[str, Any]]:
+    if tiled:
+        # тайлы одного кадра уже батч, микро-батчер для них не нужен
+        if pool is not None:
+            return await pool.predict_tiled(img_bytes, conf, imgsz, TILE_CONFIG)
+        return await run_in_threadpool(_predict_tiled_from_bytes, img_bytes, conf, imgsz)
+    if BATCHING_ENABLED:
+        item = img_bytes if pool is not None else await run_in_threadpool(_decode, img_bytes, imgsz)
+        return await batcher.submit(item, conf, imgsz)
+    if pool is not None:
+        return await _predict_in_pool(img_bytes, conf, imgsz)
+    return await run_in_threadpool(_predict_from_bytes, img_bytes, conf, imgsz)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus: задержки запросов и этапов, очередь батчера, загрузка воркеров и threadpool."""
+    body, content_type = render_metrics(batcher.depth(), pool.in_flight if pool is not None else 0)
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/stats")
+async def stats():
+    """Метрики батчера (размеры батчей, ожидание в очереди) и кэша результатов."""
+    return {
+        "batching": {
+            "enabled": BATCHING_ENABLED,
+            "max_batch_size": BATCH_MAX_SIZE,
+            "max_wait_ms": BATCH_MAX_WAIT_MS,
+            **batcher.stats.snapshot(),
+        },
+        "cache": inference_cache.snapshot(),
+        "model": {"format": MODEL_FORMAT, "path": MODEL_PATH},
+        "workers": pool.snapshot() if pool is not None else {"workers": 0},
+    }
+
+
+@app.get("/info")
+async def info():
+    """
+    Параметры модели для клиентов. input_size — длинная сторона, больше которой присылать
+    фото бессмысленно: letterbox всё равно уменьшит его до imgsz.
+    """
+    return {
+        "model_format": MODEL_FORMAT,
+        # версия весов (имя, размер, mtime): клиенты добавляют её в ключи своих кэшей
+        "model_fingerprint": inference_cache.model_fingerprint(),
+        "conf": DEFAULT_CONF,
+        "imgsz": DEFAULT_IMGSZ,
+        # в тайловом режиме нужен полный кадр: 0 — присылать оригинал
+        "input_size": 0 if TILED_DEFAULT else DEFAULT_IMGSZ,
+        "tiling": {"default": TILED_DEFAULT, **TILE_CONFIG._asdict()},
+    }
+
+
+@app.get("/ready")
+async def ready():
+    """Готовность к трафику: модель загружена и прогрета, сервис не в процессе остановки."""
+    if not _state["ready"]:
+        status = "draining" if _state["draining"] else "starting"
+        return JSONResponse(status_code=503, content={"status": status})
+    if pool is not None and not pool.ready:
+        # все процессы-воркеры упали и ещё прогреваются заново
+        return JSONResponse(status_code=503, content={"status": "restarting"})
+    return {"status": "ready"}
@@ -0,0 +1,207 @@
+import asyncio
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import tracing
+from errors import ServiceUnavailable
+
+
+# runner(inputs, conf, imgsz) -> список bbox-листов (или исключений), по одному на каждый вход
+BatchRunner = Callable[[List[Any], float, int], Awaitable[List[List[Dict[str, Any]]]]]
+
+
+@dataclass
+class _Pending:
+    item: Any
+    conf: float
+    imgsz: int
+    future: asyncio.Future
+    enqueued_at: float
+    # контекст трейса запроса: батч выполняется в фоновой задаче, вне спана запроса
+    trace_context: Any = None
+
+
+class BatchStats:
+    """Скользящая статистика по размерам батчей и времени ожидания в очереди."""
+
+    def __init__(self, window: int = 1000):
+        self.batches = 0
+        self.requests = 0
+        self._sizes: Deque[int] = deque(maxlen=window)
+        self._waits_ms: Deque[float] = deque(maxlen=window)
+        self._size_hist: Counter = Counter()
+
+    def record(self, size: int, waits_ms: List[float]) -> None:
+        self.batches += 1
+        self.requests += size
+        self._sizes.append(size)
+        self._waits_ms.extend(waits_ms)
+        self._size_hist[size] += 1
+
+    @staticmethod
+    def _percentile(values: List[float], q: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        idx = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def snapshot(self) -> Dict[str, Any]:
+        sizes = list(self._sizes)
+        waits = list(self._waits_ms)
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "batch_size_mean": sum(sizes) / len(sizes) if sizes else 0.0,
+            "batch_size_max": max(sizes) if sizes else 0,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self._size_hist.items())},
+            "queue_wait_ms_p50": self._percentile(waits, 0.50),
+            "queue_wait_ms_p95": self._percentile(waits, 0.95),
+            "queue_wait_ms_max": max(waits) if waits else 0.0,
+        }
+
+
+class MicroBatcher:
+    """
+    Собирает конкурентные запросы в окно (max_batch_size / max_wait_ms)
+    и запускает один батчевый прогон модели на окно.
+    Запросы с разными conf/imgsz в одном окне уходят отдельными батчами,
+    так как model.predict принимает одно значение параметров на вызов.
+    max_concurrent_batches > 1 позволяет держать в работе несколько батчей сразу,
+    например по одному на процесс-воркер.
+    """
+
+    def __init__(
+        self,
+        runner: BatchRunner,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_concurrent_batches: int = 1,
+        on_batch: Optional[Callable[[int, List[float]], None]] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        if max_concurrent_batches < 1:
+            raise ValueError("max_concurrent_batches must be >= 1")
+        self.runner = runner
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_concurrent_batches = max_concurrent_batches
+        self.stats = BatchStats()
+        # on_batch(size, waits_ms) — внешний наблюдатель, например метрики
+        self.on_batch = on_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._running: Set[asyncio.Task] = set()
+        self._collecting: List[_Pending] = []
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, drain_timeout: float = 0.0) -> None:
+        """Останавливает батчер; с drain_timeout > 0 сначала даёт дообработать очередь."""
+        if self._task is None:
+            return
+        if drain_timeout > 0:
+            deadline = time.perf_counter() + drain_timeout
+            while (not self._queue.empty() or self._collecting or self._running) and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for task in list(self._running):
+            task.cancel()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        # Всё, что не успело уйти в модель, завершаем ошибкой
+        stranded, self._collecting = self._collecting, []
+        for pending in stranded:
+            if not pending.future.done():
+                pending.future.set_exception(ServiceUnavailable("batcher stopped"))
+        while self._queue is not None and not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(ServiceUnavailable("batcher stopped"))
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, item: Any, conf: float, imgsz: int) -> List[Dict[str, Any]]:
+        if self._queue is None or self._task is None:
+            raise ServiceUnavailable("batcher is not running")
+        loop = asyncio.get_running_loop()
+        pending = _Pending(item, conf, imgsz, loop.create_future(), time.perf_counter(), tracing.current_context())
+        await self._queue.put(pending)
+        return await pending.future
+
+    async def _collect(self) -> List[_Pending]:
+        assert self._queue is not None
+        batch = self._collecting = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                # окно закрыто, но забираем то, что уже лежит в очереди
+                if self._queue.empty():
+                    break
+                batch.append(self._queue.get_nowait())
+                continue
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            groups: Dict[Tuple[float, int], List[_Pending]] = {}
+            for pending in batch:
+                groups.setdefault((pending.conf, pending.imgsz), []).append(pending)
+            for (conf, imgsz), items in groups.items():
+                await self._slots.acquire()
+                task = asyncio.create_task(self._run_group(items, conf, imgsz))
+                self._running.add(task)
+                task.add_done_callback(self._group_done)
+            self._collecting = []
+
+    def _group_done(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        self._slots.release()
+
+    async def _run_group(self, items: List[_Pending], conf: float, imgsz: int) -> None:
+        started = time.perf_counter()
+        waits_ms = [(started - p.enqueued_at) * 1000.0 for p in items]
+        self.stats.record(len(items), waits_ms)
+        if self.on_batch is not None:
+            self.on_batch(len(items), waits_ms)
+        try:
+            with tracing.batch_span("batch", [p.trace_context for p in items], size=len(items)):
+                results = await self.runner([p.item for p in items], conf, imgsz)
+            if len(results) != len(items):
+                raise RuntimeError(f"runner returned {len(results)} results for {len(items)} inputs")
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                e = ServiceUnavailable("batcher stopped")
+            for p in items:
+                if not p.future.done():
+                    p.future.set_exception(e)
+            return
+        for p, bboxes in zip(items, results):
+            if p.future.done():
+                continue
+            # runner может вернуть исключение для отдельного входа, не роняя весь батч
+            if isinstance(bboxes, Exception):
+                p.future.set_exception(bboxes)
+            else:
+                p.future.set_result(bboxes)
@@ -0,0 +1,167 @@
+"""
+Сравнение бэкендов инференса на валидационной папке: задержка на фото и совпадение детекций.
+
+    python bench/compare_backends.py --images utils/synthetic_dataset_test/images \
+        --labels utils/synthetic_dataset_test/labels \
+        --models best.pt best.onnx best_openvino_model best_int8_openvino_model
+
+Первая модель — эталон: для остальных считается, какая доля её боксов найдена
+(тот же класс, IoU >= --iou), средний IoU совпавших и разница confidence.
+С --labels (YOLO txt) дополнительно считаются precision/recall по разметке.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference  # noqa: E402
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def _iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match(reference, candidate, iou_thr):
+    """Жадное сопоставление по убыванию confidence: пары (ref, cand, iou) одного класса."""
+    pairs, used = [], set()
+    for ref in sorted(reference, key=lambda b: -b["confidence"]):
+        best, best_iou = None, iou_thr
+        ref_box = (ref["x1"], ref["y1"], ref["x2"], ref["y2"])
+        for j, cand in enumerate(candidate):
+            if j in used or cand["class_id"] != ref["class_id"]:
+                continue
+            iou = _iou(ref_box, (cand["x1"], cand["y1"], cand["x2"], cand["y2"]))
+            if iou >= best_iou:
+                best, best_iou = j, iou
+        if best is not None:
+            used.add(best)
+            pairs.append((ref, candidate[best], best_iou))
+    return pairs
+
+
+def read_labels(path, width, height):
+    """YOLO txt -> боксы в пикселях в том же формате, что отдаёт сервис"""
+    boxes = []
+    if not os.path.exists(path):
+        return boxes
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 5:
+                continue
+            cls, xc, yc, w, h = int(parts[0]), *map(float, parts[1:])
+            boxes.append({
+                "x1": (xc - w / 2) * width, "y1": (yc - h / 2) * height,
+                "x2": (xc + w / 2) * width, "y2": (yc + h / 2) * height,
+                "confidence": 1.0, "class_id": cls,
+            })
+    return boxes
+
+
+def run_model(model_path, images, conf, imgsz, warmup):
+    model = inference.load_model(model_path)
+    inference.warmup(model, imgsz, runs=warmup)
+    predictions, latencies = [], []
+    for img in images:
+        started = time.perf_counter()
+        predictions.append(inference.predict_batch(model, [img], conf, imgsz)[0])
+        latencies.append((time.perf_counter() - started) * 1000.0)
+    return predictions, latencies
+
+
+def summarize_latency(latencies):
+    ordered = sorted(latencies)
+    return {
+        "mean_ms": statistics.fmean(ordered),
+        "p50_ms": ordered[len(ordered) // 2],
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+    }
+
+
+def agreement(reference, predictions, iou_thr):
+    ref_total = sum(len(r) for r in reference)
+    cand_total = sum(len(p) for p in predictions)
+    pairs = [pair for ref, cand in zip(reference, predictions) for pair in match(ref, cand, iou_thr)]
+    return {
+        "matched_of_reference": len(pairs) / ref_total if ref_total else 1.0,
+        "extra_boxes": cand_total - len(pairs),
+        "mean_iou": float(np.mean([iou for _, _, iou in pairs])) if pairs else 0.0,
+        "max_conf_diff": max((abs(r["confidence"] - c["confidence"]) for r, c, _ in pairs), default=0.0),
+    }
+
+
+def accuracy(ground_truth, predictions, iou_thr):
+    gt_total = sum(len(g) for g in ground_truth)
+    pred_total = sum(len(p) for p in predictions)
+    tp = sum(len(match(gt, pred, iou_thr)) for gt, pred in zip(ground_truth, predictions))
+    return {
+        "precision": tp / pred_total if pred_total else 0.0,
+        "recall": tp / gt_total if gt_total else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", required=True, help="папка с валидационными фото")
+    parser.add_argument("--labels", help="папка с YOLO-разметкой (имя файла как у фото, .txt)")
+    parser.add_argument("--models", nargs="+", required=True, help="первая модель — эталон")
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--iou", type=float, default=0.5)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--json", help="куда сохранить отчёт")
+    args = parser.parse_args()
+
+    names = sorted(n for n in os.listdir(args.images) if n.lower().endswith(IMAGE_EXTS))[:args.limit]
+    # декодирование вне замера: сравниваем только сам инференс
+    images = [Image.open(os.path.join(args.images, n)).convert("RGB") for n in names]
+    ground_truth = None
+    if args.labels:
+        ground_truth = [read_labels(os.path.join(args.labels, os.path.splitext(n)[0] + ".txt"), *img.size)
+                        for n, img in zip(names, images)]
+
+    report = {"images": len(images), "conf": args.conf, "imgsz": args.imgsz, "models": {}}
+    reference = None
+    for model_path in args.models:
+        predictions, latencies = run_model(model_path, images, args.conf, args.imgsz, args.warmup)
+        entry = {"latency": summarize_latency(latencies)}
+        if reference is None:
+            reference = predictions
+        else:
+            entry["agreement"] = agreement(reference, predictions, args.iou)
+        if ground_truth is not None:
+            entry["accuracy"] = accuracy(ground_truth, predictions, args.iou)
+        report["models"][model_path] = entry
+
+    base_ms = None
+    for model_path, entry in report["models"].items():
+        lat = entry["latency"]
+        base_ms = base_ms or lat["mean_ms"]
+        line = (f"{model_path:32s} mean {lat['mean_ms']:7.1f} ms  p50 {lat['p50_ms']:7.1f}  "
+                f"p95 {lat['p95_ms']:7.1f}  x{base_ms / lat['mean_ms']:.2f}")
+        if "agreement" in entry:
+            ag = entry["agreement"]
+            line += (f"  matched {ag['matched_of_reference']:.1%}  extra {ag['extra_boxes']}  "
+                     f"IoU {ag['mean_iou']:.3f}  dconf {ag['max_conf_diff']:.3f}")
+        if "accuracy" in entry:
+            acc = entry["accuracy"]
+            line += f"  P {acc['precision']:.3f}  R {acc['recall']:.3f}"
+        print(line)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,92 @@
+"""
+Замер декодирования фото перед инференсом: время и пиковая память на запрос.
+
+    python bench/decode.py                      # синтетическое фото 5152x3864
+    python bench/decode.py --image photo.jpg --imgsz 640 --repeat 20
+
+legacy   — прежний путь: PIL open + convert("RGB"), затем ultralytics делает np.asarray и RGB->BGR
+full     — cv2.imdecode сразу в BGR-массив, полный размер
+reduced  — cv2.imdecode с IMREAD_REDUCED_COLOR_* под imgsz (по умолчанию в сервисе)
+
+Память считается через tracemalloc: массивы numpy/OpenCV туда попадают,
+внутренние буферы libjpeg — нет, так что это оценка снизу.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference  # noqa: E402
+
+
+def legacy(img_bytes, imgsz):
+    img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+    # то, что ultralytics делает с PIL-входом перед letterbox
+    return np.ascontiguousarray(np.asarray(img)[..., ::-1])
+
+
+def full(img_bytes, imgsz):
+    return inference.decode_image(img_bytes).array
+
+
+def reduced(img_bytes, imgsz):
+    return inference.decode_image(img_bytes, imgsz).array
+
+
+def synthetic_photo(width, height, quality=92):
+    rng = np.random.default_rng(0)
+    # шум поверх градиента, чтобы JPEG был похож по размеру на фото с телефона
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    image = np.clip(gradient + rng.normal(0, 12, (height, width, 3)), 0, 255).astype(np.uint8)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes()
+
+
+def measure(fn, img_bytes, imgsz, repeat):
+    fn(img_bytes, imgsz)
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn(img_bytes, imgsz)
+        times.append((time.perf_counter() - started) * 1000.0)
+    tracemalloc.start()
+    out = fn(img_bytes, imgsz)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "shape": out.shape,
+        "mean_ms": statistics.fmean(times),
+        "p50_ms": sorted(times)[len(times) // 2],
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image", help="путь к JPEG; без него генерируется синтетическое фото")
+    parser.add_argument("--width", type=int, default=5152)
+    parser.add_argument("--height", type=int, default=3864)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            img_bytes = f.read()
+    else:
+        img_bytes = synthetic_photo(args.width, args.height)
+    print(f"input: {len(img_bytes) / 1024 / 1024:.1f} MB, imgsz={args.imgsz}")
+
+    for name, fn in (("legacy", legacy), ("full", full), ("reduced", reduced)):
+        r = measure(fn, img_bytes, args.imgsz, args.repeat)
+        print(f"{name:8s} {str(r['shape']):18s} mean {r['mean_ms']:7.1f} ms  p50 {r['p50_ms']:7.1f} ms  "
+              f"peak {r['peak_mb']:6.1f} MB")
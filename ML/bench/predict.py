@@ -0,0 +1,299 @@
+"""
+Микро-бенчмарк инференса без HTTP: тот же путь, что у _predict_from_bytes
+(inference.decode_image -> inference.predict_batch), на фиксированном наборе фото
+и сетке imgsz / conf / размеров батча.
+
+    python bench/predict.py --images utils/synthetic_dataset_test/images --limit 32 \
+        --imgsz 640 960 --batch 1 4 8 --json report.json
+
+    # эталон на этой машине, затем проверка изменения (весов, формата экспорта, декодирования)
+    python bench/predict.py --images ... --save-baseline bench/baseline.json
+    python bench/predict.py --images ... --baseline bench/baseline.json --threshold 0.1
+
+На каждую конфигурацию: время этапов на одно фото (decode; preprocess / inference / nms
+из Results.speed ultralytics; postprocess — наш перевод в bbox), фото в секунду,
+фото в секунду на ядро (на поток torch) и пиковый RSS процесса. В Linux пик сбрасывается
+перед каждой конфигурацией; в других ОС он накопительный, поэтому конфигурации идут
+от меньших imgsz и батчей к большим.
+
+С --baseline сравнивает с эталоном и завершается с кодом 1, если фото в секунду, полное время
+на фото (total) или RSS ухудшились больше чем на --threshold. Времена отдельных этапов только
+выводятся: этапы короче миллисекунды шумят на десятки процентов от запуска к запуску.
+Разница меньше --min-delta-ms не считается ухудшением ни для total, ни для этапов.
+Изменение среднего числа детекций на фото выводится отдельно — это сигнал, что поменялась
+точность, а не скорость.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference  # noqa: E402
+from decode import synthetic_photo  # noqa: E402
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+# этапы, время которых растёт при регрессии
+STAGES = ("decode", "preprocess", "inference", "nms", "postprocess", "total")
+
+
+def load_corpus(images_dir, limit):
+    if not images_dir:
+        # одно синтетическое фото с телефона, если своего набора нет
+        return [synthetic_photo(5152, 3864)]
+    names = sorted(n for n in os.listdir(images_dir) if n.lower().endswith(IMAGE_EXTS))[:limit]
+    corpus = []
+    for name in names:
+        with open(os.path.join(images_dir, name), "rb") as f:
+            corpus.append(f.read())
+    if not corpus:
+        raise SystemExit(f"в {images_dir} нет изображений")
+    return corpus
+
+
+def reset_peak_rss():
+    """Сбрасывает пиковый RSS процесса (Linux); False, если так нельзя и пик накопительный."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss в Linux — в килобайтах, в macOS — в байтах
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def torch_threads():
+    try:
+        import torch
+    except ImportError:
+        return os.cpu_count() or 1
+    return torch.get_num_threads()
+
+
+class _SpeedProbe:
+    """Обёртка модели: predict_batch не отдаёт Results, а разбивка по этапам есть только в Results.speed."""
+
+    def __init__(self, model):
+        self.model = model
+        self.speeds = []
+
+    def predict(self, *args, **kwargs):
+        results = self.model.predict(*args, **kwargs)
+        self.speeds.extend(getattr(r, "speed", None) or {} for r in results)
+        return results
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+def run_batch(model, batch, conf, imgsz, reduced):
+    """Один батч тем же путём, что в сервисе; возвращает время этапов батча (мс) и bbox."""
+    timings = {}
+    started = time.perf_counter()
+    with inference.timed(timings, "decode"):
+        images = [inference.decode_image(b, imgsz if reduced else None) for b in batch]
+    probe = _SpeedProbe(model)
+    bboxes = inference.predict_batch(probe, images, conf, imgsz, timings)
+    speeds = probe.speeds
+    stages = {
+        "decode": timings["decode"] * 1000,
+        "postprocess": timings["postprocess"] * 1000,
+        "total": (time.perf_counter() - started) * 1000,
+    }
+    if speeds and all(speeds):
+        # Results.speed — мс на одно фото, усреднённые по батчу
+        stages["preprocess"] = sum(s.get("preprocess", 0.0) for s in speeds)
+        stages["inference"] = sum(s.get("inference", 0.0) for s in speeds)
+        stages["nms"] = sum(s.get("postprocess", 0.0) for s in speeds)
+    else:
+        stages["inference"] = timings["predict"] * 1000
+    return stages, bboxes
+
+
+def bench_config(model, corpus, conf, imgsz, batch_size, reduced, rounds, threads):
+    # батчи по кругу из корпуса, чтобы состав батча не зависел от его размера
+    batches = []
+    for r in range(rounds):
+        for i in range(0, len(corpus), batch_size):
+            batches.append([corpus[(i + j) % len(corpus)] for j in range(batch_size)])
+    run_batch(model, batches[0], conf, imgsz, reduced)  # прогрев под этот imgsz
+    reset_peak_rss()
+
+    per_image = {stage: [] for stage in STAGES}
+    detections = []
+    started = time.perf_counter()
+    for batch in batches:
+        stages, bboxes = run_batch(model, batch, conf, imgsz, reduced)
+        for stage, ms in stages.items():
+            per_image[stage].append(ms / len(batch))
+        detections.extend(len(b) for b in bboxes)
+    elapsed = time.perf_counter() - started
+
+    images = sum(len(b) for b in batches)
+    return {
+        "imgsz": imgsz,
+        "conf": conf,
+        "batch": batch_size,
+        "decode": "reduced" if reduced else "full",
+        "images": images,
+        "images_per_sec": images / elapsed,
+        "images_per_sec_per_core": images / elapsed / threads,
+        "stages_ms": {
+            stage: {
+                "mean": statistics.fmean(values),
+                "p50": statistics.median(values),
+                "p95": sorted(values)[math.ceil(0.95 * len(values)) - 1],
+            }
+            for stage, values in per_image.items() if values
+        },
+        "detections_per_image": statistics.fmean(detections) if detections else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def config_key(result):
+    return f"imgsz={result['imgsz']} conf={result['conf']:g} batch={result['batch']} decode={result['decode']}"
+
+
+def compare(report, baseline, threshold, min_delta_ms=1.0):
+    """
+    Ухудшения, замедления отдельных этапов (без влияния на результат) и изменения детекций —
+    списки (конфигурация, метрика, было, стало, доля), плюс число конфигураций, найденных в эталоне.
+    """
+    before = {config_key(r): r for r in baseline["results"]}
+    regressions, slower_stages, changes, matched = [], [], [], 0
+    for result in report["results"]:
+        key = config_key(result)
+        old = before.get(key)
+        if old is None:
+            continue
+        matched += 1
+        checks = [("images_per_sec", old["images_per_sec"], result["images_per_sec"], -1),
+                  ("peak_rss_mb", old["peak_rss_mb"], result["peak_rss_mb"], 1)]
+        for stage, values in result["stages_ms"].items():
+            if stage in old["stages_ms"]:
+                checks.append((f"{stage}_p50_ms", old["stages_ms"][stage]["p50"], values["p50"], 1))
+        for metric, was, now, worse_sign in checks:
+            if was <= 0:
+                continue
+            delta = (now - was) / was
+            if delta * worse_sign <= threshold:
+                continue
+            if metric.endswith("_ms") and now - was < min_delta_ms:
+                continue
+            if metric.endswith("_ms") and metric != "total_p50_ms":
+                slower_stages.append((key, metric, was, now, delta))
+            else:
+                regressions.append((key, metric, was, now, delta))
+        was, now = old["detections_per_image"], result["detections_per_image"]
+        if was and abs(now - was) / was > threshold:
+            changes.append((key, "detections_per_image", was, now, (now - was) / was))
+    return regressions, slower_stages, changes, matched
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH") or inference.model_path_for("pt"))
+    parser.add_argument("--images", help="папка с фото; без неё — одно синтетическое фото 5152x3864")
+    parser.add_argument("--limit", type=int, default=16)
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[640])
+    parser.add_argument("--conf", type=float, nargs="+", default=[0.25])
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--rounds", type=int, default=3, help="проходов по корпусу на конфигурацию")
+    parser.add_argument("--threads", type=int, default=0, help="потоки torch; 0 — как есть")
+    parser.add_argument("--full-decode", action="store_true", help="декодировать в полном размере (DECODE_REDUCED=0)")
+    parser.add_argument("--json", help="куда сохранить отчёт")
+    parser.add_argument("--save-baseline", help="сохранить отчёт как эталон")
+    parser.add_argument("--baseline", help="эталон для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.10, help="допустимое ухудшение, доля")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="разница во времени на фото, которая ещё считается шумом, мс")
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+
+        torch.set_num_threads(args.threads)
+    corpus = load_corpus(args.images, args.limit)
+    reset_peak_rss()
+    rss_before_model = peak_rss_mb()
+    model = inference.load_model(args.model)
+    inference.warmup(model, min(args.imgsz))
+    threads = torch_threads()
+
+    report = {
+        "meta": {
+            "model": os.path.basename(os.path.normpath(args.model)),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "threads": threads,
+            "corpus": args.images or "synthetic",
+            "corpus_images": len(corpus),
+            "corpus_mb": sum(map(len, corpus)) / 1024 / 1024,
+            "peak_rss_mb_before_model": rss_before_model,
+            "peak_rss_mb_after_model": peak_rss_mb(),
+        },
+        "results": [],
+    }
+    for imgsz in sorted(args.imgsz):
+        for batch_size in sorted(args.batch):
+            for conf in args.conf:
+                r = bench_config(model, corpus, conf, imgsz, batch_size, not args.full_decode, args.rounds, threads)
+                report["results"].append(r)
+                stages = "  ".join(f"{s} {v['p50']:.1f}" for s, v in r["stages_ms"].items())
+                print(f"{config_key(r):45s} {r['images_per_sec']:7.2f} img/s  "
+                      f"{r['images_per_sec_per_core']:6.2f} img/s/core  RSS {r['peak_rss_mb']:7.1f} MB  "
+                      f"p50 ms/img: {stages}")
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("model") != report["meta"]["model"]:
+            print(f"эталон снят на модели {baseline['meta'].get('model')}, сейчас {report['meta']['model']}")
+        regressions, slower_stages, changes, matched = compare(report, baseline, args.threshold, args.min_delta_ms)
+        if not matched:
+            sys.exit("в эталоне нет ни одной из этих конфигураций")
+        for key, metric, was, now, delta in changes:
+            print(f"ДЕТЕКЦИИ  {key}: {metric} {was:.2f} -> {now:.2f} ({delta:+.1%})")
+        for key, metric, was, now, delta in slower_stages:
+            print(f"ЭТАП      {key}: {metric} {was:.2f} -> {now:.2f} ({delta:+.1%})")
+        for key, metric, was, now, delta in regressions:
+            print(f"РЕГРЕССИЯ {key}: {metric} {was:.2f} -> {now:.2f} ({delta:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print(f"регрессий больше {args.threshold:.0%} нет (эталон {baseline['meta'].get('commit')})")
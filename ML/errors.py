@@ -0,0 +1,6 @@
+class ImageDecodeError(RuntimeError):
+    """Присланные байты не читаются как изображение — ошибка клиента (HTTP 400)."""
+
+
+class ServiceUnavailable(RuntimeError):
+    """Сервис останавливается или ещё не готов: запрос можно повторить (HTTP 503)."""
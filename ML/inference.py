@@ -0,0 +1,173 @@
+import io
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import tracing
+from errors import ImageDecodeError
+
+
+@contextmanager
+def timed(timings: Optional[Dict[str, float]], stage: str):
+    """
+    Добавляет длительность блока в timings[stage]; внутри записываемого трейса
+    блок ещё и спан с тем же именем. Без timings только спан.
+    """
+    if timings is None:
+        with tracing.span(stage):
+            yield
+        return
+    started = time.perf_counter()
+    try:
+        with tracing.span(stage):
+            yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+# Файлы модели по формату: экспорт из best.pt через utils/export_model.py
+MODEL_FILES = {
+    "pt": "best.pt",
+    "onnx": "best.onnx",
+    "openvino": "best_openvino_model",
+    "openvino_int8": "best_int8_openvino_model",
+}
+
+
+def model_path_for(model_format: str) -> str:
+    try:
+        return MODEL_FILES[model_format]
+    except KeyError:
+        raise ValueError(f"unknown model format {model_format!r}, expected one of {sorted(MODEL_FILES)}")
+
+
+def load_model(model_path: str):
+    """
+    Загрузка YOLO; ultralytics импортируем здесь, чтобы процессы-воркеры грузили его сами.
+    Экспортированные модели (.onnx, *_openvino_model/) ultralytics запускает через
+    ONNX Runtime / OpenVINO, пред- и постобработка (letterbox, NMS) остаются те же.
+    """
+    from ultralytics import YOLO
+
+    # для экспортированных форматов задача не читается из весов, указываем явно
+    return YOLO(model_path, task="detect")
+
+
+def warmup(model, imgsz: int = 640, runs: int = 2) -> None:
+    """Несколько прогонов на пустом кадре: первый predict инициализирует слои и аллокаторы."""
+    blank = Image.new("RGB", (imgsz, imgsz))
+    for _ in range(runs):
+        model.predict([blank], imgsz=imgsz, verbose=False)
+
+
+# Флаги уменьшенного декодирования: JPEG масштабируется ещё в IDCT, без полноразмерного кадра
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+class DecodedImage(NamedTuple):
+    array: np.ndarray  # BGR uint8, как ultralytics ждёт numpy-вход
+    scale_x: float     # во сколько раз исходник шире декодированного кадра
+    scale_y: float
+
+
+def reduction_for(width: int, height: int, imgsz: Optional[int]) -> int:
+    """Наибольший делитель 2/4/8, при котором длинная сторона остаётся не меньше imgsz."""
+    if not imgsz:
+        return 1
+    longest = max(width, height)
+    for factor, _ in _REDUCED_FLAGS:
+        if longest // factor >= imgsz:
+            return factor
+    return 1
+
+
+def decode_image(img_bytes: bytes, imgsz: Optional[int] = None) -> DecodedImage:
+    """
+    Декодирование сразу в BGR-массив для модели, минуя PIL -> RGB -> numpy -> BGR.
+    С imgsz крупные фото декодируются в уменьшенном размере (1/2, 1/4, 1/8),
+    коэффициенты возвращаются, чтобы перевести боксы обратно в координаты исходника.
+    EXIF-поворот не применяется, как и раньше при Image.open().convert("RGB").
+    """
+    try:
+        # заголовок читается без декодирования пикселей
+        width, height = Image.open(io.BytesIO(img_bytes)).size
+    except Exception as e:
+        raise ImageDecodeError(f"can't open image: {e}")
+    factor = reduction_for(width, height, imgsz)
+    flag = dict(_REDUCED_FLAGS).get(factor, cv2.IMREAD_COLOR)
+    array = cv2.imdecode(np.frombuffer(img_bytes, dtype=np.uint8), flag | cv2.IMREAD_IGNORE_ORIENTATION)
+    if array is None:
+        raise ImageDecodeError("can't open image: decode failed")
+    return DecodedImage(array, width / array.shape[1], height / array.shape[0])
+
+
+def result_to_bboxes(r, names) -> List[Dict[str, Any]]:
+    out = []
+    # r.boxes содержит координаты в формате xyxy
+    # .xyxy, .conf, .cls
+    boxes = getattr(r.boxes, "xyxy", None)
+    confs = getattr(r.boxes, "conf", None)
+    classes = getattr(r.boxes, "cls", None)
+
+    names = names or {}
+
+    if boxes is None:
+        return out
+
+    # boxes is a tensor-like; convert to numpy
+    boxes_np = boxes.cpu().numpy() if hasattr(boxes, "cpu") else np.array(boxes)
+    confs_np = confs.cpu().numpy() if hasattr(confs, "cpu") else np.array(confs)
+    classes_np = classes.cpu().numpy() if hasattr(classes, "cpu") else np.array(classes)
+
+    for i in range(len(boxes_np)):
+        x1, y1, x2, y2 = boxes_np[i].tolist()
+        confv = float(confs_np[i])
+        cls_id = int(classes_np[i])
+        cls_name = str(names.get(cls_id, str(cls_id)))
+        out.append({
+            "x1": float(x1),
+            "y1": float(y1),
+            "x2": float(x2),
+            "y2": float(y2),
+            "confidence": confv,
+            "class_id": cls_id,
+            "class_name": cls_name
+        })
+
+    return out
+
+
+def rescale(bboxes: List[Dict[str, Any]], scale_x: float, scale_y: float) -> List[Dict[str, Any]]:
+    for b in bboxes:
+        b["x1"] *= scale_x
+        b["x2"] *= scale_x
+        b["y1"] *= scale_y
+        b["y2"] *= scale_y
+    return bboxes
+
+
+def predict_batch(
+    model, images: List[Any], conf: float, imgsz: int, timings: Optional[Dict[str, float]] = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    Blocking prediction для батча: один вызов model.predict, по списку bbox на каждое изображение.
+    images — DecodedImage (боксы возвращаются в координатах исходника) или PIL.Image.
+    timings, если передан, получает время этапов predict и postprocess.
+    """
+    # ultralytics принимает список PIL.Image или BGR-массивов, результаты идут в том же порядке
+    inputs = [img.array if isinstance(img, DecodedImage) else img for img in images]
+    with timed(timings, "predict"):
+        results = model.predict(inputs, conf=conf, imgsz=imgsz)
+    names = getattr(model, "names", None)
+    out = []
+    with timed(timings, "postprocess"):
+        for img, r in zip(images, results):
+            bboxes = result_to_bboxes(r, names)
+            if isinstance(img, DecodedImage) and (img.scale_x != 1.0 or img.scale_y != 1.0):
+                bboxes = rescale(bboxes, img.scale_x, img.scale_y)
+            out.append(bboxes)
+    return out
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Грубая оценка памяти на запись: ключ/служебные поля + словарь на каждый bbox
+_ENTRY_OVERHEAD_BYTES = 256
+_BBOX_BYTES = 600
+
+
+def _estimate_size(bboxes: List[Dict[str, Any]]) -> int:
+    return _ENTRY_OVERHEAD_BYTES + _BBOX_BYTES * len(bboxes)
+
+
+class InferenceCache:
+    """
+    LRU-кэш результатов детекции по ключу (sha256 изображения, conf, imgsz, версия весов).
+
+    Записи вытесняются по количеству, суммарному объёму и TTL.
+    Версия весов — размер и mtime файла MODEL_PATH: при их изменении кэш сбрасывается.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 3600.0,
+        check_interval: float = 5.0,
+    ):
+        self.model_path = model_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, Tuple[float, int, List[Dict[str, Any]]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._fingerprint = self._read_fingerprint()
+        self._checked_at = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def _read_fingerprint(self) -> str:
+        # экспорт OpenVINO — каталог (.xml + .bin), учитываем все файлы внутри
+        try:
+            if os.path.isdir(self.model_path):
+                stats = [os.stat(os.path.join(self.model_path, name)) for name in sorted(os.listdir(self.model_path))]
+            else:
+                stats = [os.stat(self.model_path)]
+        except OSError:
+            return "missing"
+        size = sum(st.st_size for st in stats)
+        mtime = max((st.st_mtime_ns for st in stats), default=0)
+        return f"{os.path.basename(self.model_path)}-{size}-{mtime}"
+
+    def model_fingerprint(self) -> str:
+        """Текущая версия весов; при смене файла на диске кэш очищается."""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._fingerprint
+        fingerprint = self._read_fingerprint()
+        with self._lock:
+            self._checked_at = now
+            if fingerprint != self._fingerprint:
+                self._fingerprint = fingerprint
+                self._entries.clear()
+                self._bytes = 0
+                self.invalidations += 1
+        return fingerprint
+
+    def make_key(self, img_bytes: bytes, conf: float, imgsz: int, variant: str = "") -> str:
+        """variant различает режимы инференса одного и того же кадра (например, тайлинг)."""
+        digest = hashlib.sha256(img_bytes).hexdigest()
+        return f"{digest}:{conf:g}:{imgsz}:{variant}:{self.model_fingerprint()}"
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, size, bboxes = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self._bytes -= size
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return bboxes
+
+    def put(self, key: str, bboxes: List[Dict[str, Any]]) -> None:
+        if not self.enabled:
+            return
+        size = _estimate_size(bboxes)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (time.monotonic(), size, bboxes)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "model_fingerprint": self._fingerprint,
+            }
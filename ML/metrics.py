@@ -0,0 +1,89 @@
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Gauge, Histogram, generate_latest
+
+
+# Секунды: от декодирования маленьких фото до тайлового инференса на CPU
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    "ml_http_request_duration_seconds",
+    "Задержка HTTP-запросов по шаблону маршрута",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "ml_stage_duration_seconds",
+    "Этапы инференса: decode, queue_wait, predict, postprocess, tile_merge (на вызов, для батча — на батч)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+BATCH_SIZE = Histogram("ml_batch_size", "Размер батчей микро-батчера", buckets=(1, 2, 4, 8, 16, 32, 64))
+INFERENCE_IN_FLIGHT = Gauge(
+    "ml_inference_in_flight", "Запросы /analyze, ушедшие в модель (мимо кэша)", multiprocess_mode="livesum"
+)
+BATCH_QUEUE_DEPTH = Gauge("ml_batch_queue_depth", "Запросы, ждущие в очереди микро-батчера", multiprocess_mode="livesum")
+POOL_IN_FLIGHT = Gauge("ml_pool_batches_in_flight", "Батчи в процессах-воркерах", multiprocess_mode="livesum")
+THREADPOOL_BUSY = Gauge("ml_threadpool_busy_threads", "Занятые потоки run_in_threadpool", multiprocess_mode="livesum")
+THREADPOOL_SIZE = Gauge("ml_threadpool_size", "Лимит потоков run_in_threadpool", multiprocess_mode="liveall")
+
+
+def observe_timings(timings: Dict[str, float]) -> None:
+    for stage, seconds in timings.items():
+        STAGE_LATENCY.labels(stage).observe(seconds)
+
+
+def observe_batch(size: int, waits_ms: List[float]) -> None:
+    """Колбэк MicroBatcher.on_batch: размер батча и ожидание каждого запроса в очереди."""
+    BATCH_SIZE.observe(size)
+    for wait in waits_ms:
+        STAGE_LATENCY.labels("queue_wait").observe(wait / 1000.0)
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время каждого запроса по шаблону маршрута."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.labels(scope["method"], template, str(status_code)).observe(
+                time.perf_counter() - started
+            )
+
+
+def render_metrics(batch_queue_depth: int = 0, pool_in_flight: int = 0) -> Tuple[bytes, str]:
+    """Снимок для GET /metrics; с PROMETHEUS_MULTIPROC_DIR собирает данные всех uvicorn-воркеров."""
+    from anyio.to_thread import current_default_thread_limiter
+
+    limiter = current_default_thread_limiter()
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_SIZE.set(limiter.total_tokens)
+    BATCH_QUEUE_DEPTH.set(batch_queue_depth)
+    POOL_IN_FLIGHT.set(pool_in_flight)
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
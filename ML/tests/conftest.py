@@ -0,0 +1,7 @@
+import os
+import sys
+
+# модули сервиса лежат плоско в ML/, как их импортирует app.py; утилиты датасета — в ML/utils
+_ml_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ml_dir, "utils"))
+sys.path.insert(0, _ml_dir)
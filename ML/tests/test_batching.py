@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from batching import MicroBatcher
+from errors import ServiceUnavailable
+
+
+class _Runner:
+    """Запоминает батчи; на вход "bad" возвращает исключение только для него."""
+
+    def __init__(self, gate: asyncio.Event = None):
+        self.gate = gate
+        self.calls = []
+
+    async def __call__(self, items, conf, imgsz):
+        self.calls.append((list(items), conf, imgsz))
+        if self.gate is not None:
+            await self.gate.wait()
+        return [ValueError(item) if item == "bad" else [{"item": item, "conf": conf}] for item in items]
+
+
+def test_concurrent_requests_are_grouped_by_params():
+    runner = _Runner()
+    batcher = MicroBatcher(runner, max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        await batcher.start()
+        results = await asyncio.gather(
+            batcher.submit("a", 0.25, 640),
+            batcher.submit("b", 0.5, 640),
+            batcher.submit("c", 0.25, 640),
+            batcher.submit("bad", 0.25, 640),
+            return_exceptions=True,
+        )
+        await batcher.stop()
+        return results
+
+    a, b, c, bad = asyncio.run(scenario())
+    assert a == [{"item": "a", "conf": 0.25}]
+    assert b == [{"item": "b", "conf": 0.5}]
+    assert c == [{"item": "c", "conf": 0.25}]
+    # ошибка одного входа не роняет остальные в батче
+    assert isinstance(bad, ValueError)
+    assert sorted(runner.calls) == [(["a", "c", "bad"], 0.25, 640), (["b"], 0.5, 640)]
+    assert batcher.stats.snapshot()["requests"] == 4
+
+
+def test_batch_size_is_capped():
+    runner = _Runner()
+    batcher = MicroBatcher(runner, max_batch_size=2, max_wait_ms=50)
+
+    async def scenario():
+        await batcher.start()
+        await asyncio.gather(*(batcher.submit(i, 0.25, 640) for i in range(5)))
+        await batcher.stop()
+
+    asyncio.run(scenario())
+    assert [len(items) for items, _, _ in runner.calls] == [2, 2, 1]
+
+
+def test_stop_fails_pending_requests_as_unavailable():
+    gate = asyncio.Event()
+    runner = _Runner(gate)
+    batcher = MicroBatcher(runner, max_batch_size=1, max_wait_ms=0)
+
+    async def scenario():
+        await batcher.start()
+        running = asyncio.ensure_future(batcher.submit("a", 0.25, 640))
+        queued = asyncio.ensure_future(batcher.submit("b", 0.25, 640))
+        await asyncio.sleep(0.01)
+        # без drain_timeout прогон в модели прерывается, очередь не обрабатывается
+        await batcher.stop()
+        for future in (running, queued):
+            with pytest.raises(ServiceUnavailable):
+                await future
+        with pytest.raises(ServiceUnavailable):
+            await batcher.submit("c", 0.25, 640)
+
+    asyncio.run(scenario())
+    assert [items for items, _, _ in runner.calls] == [["a"]]
+
+
+def test_stop_with_drain_timeout_finishes_queued_work():
+    gate = asyncio.Event()
+    runner = _Runner(gate)
+    batcher = MicroBatcher(runner, max_batch_size=1, max_wait_ms=0)
+
+    async def scenario():
+        await batcher.start()
+        futures = [asyncio.ensure_future(batcher.submit(item, 0.25, 640)) for item in ("a", "b")]
+        await asyncio.sleep(0.01)
+        asyncio.get_running_loop().call_later(0.05, gate.set)
+        await batcher.stop(drain_timeout=5)
+        return await asyncio.gather(*futures)
+
+    assert asyncio.run(scenario()) == [[{"item": "a", "conf": 0.25}], [{"item": "b", "conf": 0.25}]]
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("ultralytics")
+
+from shard_training import ShardYOLODataset  # noqa: E402
+from shards import ShardWriter, write_index  # noqa: E402
+from ultralytics.cfg import get_cfg  # noqa: E402
+
+
+def _write_shards(shards_dir, n=6):
+    writer = ShardWriter(shards_dir, 0)
+    for k in range(n):
+        # кадры разной ширины, чтобы rect-режим переставил их относительно шарда
+        image = np.full((40, 40 + 8 * ((k * 5) % n), 3), k * 10, dtype=np.uint8)
+        writer.write(f"{k:05d}", image, [f"{k % 2} 0.5 0.5 0.2 0.4"])
+    writer.close()
+    write_index(shards_dir)
+
+
+@pytest.mark.parametrize("mode", ["train", "val"])
+def test_dataset_reads_images_and_labels_from_shards(tmp_path, mode):
+    shards_dir = str(tmp_path)
+    _write_shards(shards_dir)
+    dataset = ShardYOLODataset(
+        img_path=shards_dir,
+        imgsz=64,
+        batch_size=2,
+        augment=mode == "train",
+        hyp=get_cfg(),
+        rect=mode == "val",
+        stride=32,
+        pad=0.0 if mode == "train" else 0.5,
+        data={"names": {0: "a", 1: "b"}, "channels": 3},
+    )
+    assert len(dataset) == 6
+    for i, im_file in enumerate(dataset.im_files):
+        k = int(os.path.splitext(os.path.basename(im_file))[0])
+        im, (h0, w0), _ = dataset.load_image(i)
+        # кадр и разметка от одного и того же сэмпла, даже после сортировки по форме
+        assert int(np.median(im)) == k * 10
+        assert (h0, w0) == (40, 40 + 8 * ((k * 5) % 6))
+        assert dataset.labels[i]["cls"].tolist() == [[k % 2]]
+        np.testing.assert_allclose(dataset.labels[i]["bboxes"], [[0.5, 0.5, 0.2, 0.4]])
+    # ни одного распакованного файла рядом с шардами
+    assert sorted(os.listdir(shards_dir)) == ["index.jsonl", "shard-00000.json", "shard-00000.tar"]
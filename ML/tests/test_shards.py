@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+import pytest
+
+from dataset_generator import SyntheticDatasetGenerator
+from shards import ShardDataset, ShardWriter, is_shard_done
+
+
+class _Interrupted(SyntheticDatasetGenerator):
+    """Генератор без исходных фото: серые кадры, на сэмпле interrupt_at — Ctrl+C."""
+
+    interrupt_at = None
+
+    def _generate_sample(self, idx):
+        if idx == self.interrupt_at:
+            raise KeyboardInterrupt
+        canvas = np.full((32, 32, 3), idx, dtype=np.uint8)
+        return canvas, ["0 0.5 0.5 0.1 0.1"], 0
+
+
+def test_interrupted_shard_is_not_committed(tmp_path, capsys):
+    generator = _Interrupted([], [], str(tmp_path), image_size=(32, 32))
+    shards_dir = os.path.join(str(tmp_path), "shards")
+
+    generator.interrupt_at = 3
+    with pytest.raises(KeyboardInterrupt):
+        generator.generate(n_samples=10, output_format="shards", samples_per_shard=10)
+    assert not is_shard_done(shards_dir, 0)
+    assert os.listdir(shards_dir) == []
+
+    # докачка генерирует шард целиком, а не пропускает его
+    generator.interrupt_at = None
+    stats = generator.generate(n_samples=10, output_format="shards", samples_per_shard=10)
+    assert "Skipping" not in capsys.readouterr().out
+    assert stats["samples"] == 10
+    dataset = ShardDataset(shards_dir)
+    assert len(dataset) == 10
+    image, labels = dataset[3]
+    assert image[0, 0, 0] == 3 and labels == ["0 0.5 0.5 0.1 0.1"]
+
+
+def test_writer_abort_leaves_nothing(tmp_path):
+    writer = ShardWriter(str(tmp_path), 0)
+    writer.write("00000", np.zeros((8, 8, 3), dtype=np.uint8), [])
+    writer.abort()
+    assert os.listdir(str(tmp_path)) == []
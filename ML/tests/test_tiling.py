@@ -0,0 +1,82 @@
+import pytest
+
+from tiling import Tile, merge, plan_tiles
+
+
+def _box(x1, y1, x2, y2, conf=0.9, cls=0):
+    return {"x1": x1, "y1": y1, "x2": x2, "y2": y2, "confidence": conf, "class_id": cls, "class_name": str(cls)}
+
+
+def _covers(tiles, width, height):
+    return all(
+        any(t.x <= x < t.x + t.w and t.y <= y < t.y + t.h for t in tiles)
+        for x in range(0, width, 7) for y in range(0, height, 7)
+    )
+
+
+def test_small_frame_is_one_tile():
+    assert plan_tiles(800, 600, 1280, 0.2, 16) == [Tile(0, 0, 800, 600)]
+
+
+def test_grid_covers_the_frame_with_the_requested_overlap():
+    tiles = plan_tiles(3000, 2000, 1000, 0.2, 16)
+    xs = sorted({t.x for t in tiles})
+    ys = sorted({t.y for t in tiles})
+    assert len(tiles) == len(xs) * len(ys)
+    # последний тайл заканчивается ровно на краю кадра
+    assert xs[-1] + 1000 == 3000 and ys[-1] + 1000 == 2000
+    assert all(b - a <= 800 for a, b in zip(xs, xs[1:]))
+    assert all(b - a <= 800 for a, b in zip(ys, ys[1:]))
+    assert _covers(tiles, 3000, 2000)
+
+
+def test_tile_grows_to_fit_the_budget():
+    tiles = plan_tiles(5152, 3864, 640, 0.2, 4)
+    assert len(tiles) <= 4
+    assert tiles[0].w > 640
+    assert _covers(tiles, 5152, 3864)
+
+
+TILES = [Tile(0, 0, 600, 600), Tile(400, 0, 600, 600), Tile(0, 0, 1000, 600)]  # два тайла + полный кадр
+
+
+def test_overlap_duplicates_collapse_to_one_box():
+    # инструмент целиком в зоне перекрытия: оба тайла видят его целиком
+    per_tile = [[_box(450, 100, 550, 200, 0.8)], [_box(52, 102, 151, 199, 0.9)], []]
+    merged = merge(per_tile, TILES, iou_thr=0.5)
+    assert len(merged) == 1 and merged[0]["confidence"] == 0.9
+
+
+def test_piece_cut_by_tile_border_is_dropped_for_the_full_frame_box():
+    # инструмент через границу тайлов: куски в тайлах и целый бокс на полном кадре.
+    # Обычный NMS оставил бы два куска: первый (score выше) подавил бы целый бокс,
+    # а со вторым у него IoU < 0.5
+    per_tile = [
+        [_box(300, 100, 598, 160, 0.95)],
+        [_box(2, 100, 300, 160, 0.9)],
+        [_box(300, 100, 700, 160, 0.7)],
+    ]
+    merged = merge(per_tile, TILES, iou_thr=0.5)
+    assert [(b["x1"], b["x2"]) for b in merged] == [(300, 700)]
+
+
+def test_piece_without_a_whole_box_of_its_class_is_kept():
+    per_tile = [[_box(300, 100, 598, 160, 0.95, cls=1)], [], [_box(300, 100, 700, 160, 0.7, cls=2)]]
+    assert len(merge(per_tile, TILES, iou_thr=0.5)) == 2
+
+
+def test_nested_boxes_away_from_tile_borders_are_kept():
+    # маленький инструмент поверх большого того же класса — не обрезанный кусок
+    per_tile = [[_box(100, 100, 300, 300, 0.9), _box(150, 150, 200, 200, 0.8)], [], []]
+    assert len(merge(per_tile, TILES, iou_thr=0.5)) == 2
+
+
+def test_frame_border_is_not_a_tile_cut():
+    # бокс у края кадра (x1=0) не считается куском, даже внутри большего бокса того же класса
+    per_tile = [[_box(0, 100, 80, 200, 0.9)], [], [_box(0, 80, 200, 220, 0.8)]]
+    assert len(merge(per_tile, TILES, iou_thr=0.5)) == 2
+
+
+@pytest.mark.parametrize("per_tile", [[[], [], []], []])
+def test_no_detections(per_tile):
+    assert merge(per_tile, TILES, iou_thr=0.5) == []
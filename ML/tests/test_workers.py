@@ -0,0 +1,83 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import workers
+from errors import ServiceUnavailable
+from workers import InferencePool
+
+
+class _FakeModel:
+    def predict(self, inputs, **kwargs):
+        return []
+
+
+def _init_fake():
+    workers._model = _FakeModel()
+
+
+def _pid():
+    return os.getpid(), {}
+
+
+def _crash():
+    # как OOM killer: процесс исчезает, не вернув результат
+    os._exit(1)
+
+
+class _FakePool(InferencePool):
+    """Пул настоящих процессов, но с моделью-заглушкой вместо весов."""
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"), initializer=_init_fake)
+
+
+async def _wait_all_alive(pool, timeout=30.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        if all(w["alive"] for w in pool.snapshot()["per_worker"]):
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+def test_dead_worker_is_replaced_and_warmed_up():
+    async def scenario():
+        pool = _FakePool("unused.pt", workers=1, warmup_imgsz=32)
+        await pool.start()
+        first_pid = await pool._submit(_pid)
+
+        with pytest.raises(ServiceUnavailable):
+            await pool._submit(_crash)
+        # единственный процесс заменяется: пул не готов и сразу отвечает 503, а не ждёт
+        assert not pool.ready
+        with pytest.raises(ServiceUnavailable):
+            await pool._submit(_pid)
+
+        assert await _wait_all_alive(pool) and pool.ready
+        assert await pool._submit(_pid) != first_pid
+        worker = pool.snapshot()["per_worker"][0]
+        assert worker["alive"] and worker["restarts"] == 1
+        await pool.stop()
+
+    asyncio.run(scenario())
+
+
+def test_other_workers_keep_serving_while_one_restarts():
+    async def scenario():
+        pool = _FakePool("unused.pt", workers=2, warmup_imgsz=32)
+        await pool.start()
+        with pytest.raises(ServiceUnavailable):
+            await pool._submit(_crash)
+        assert pool.ready
+        alive = [w["pid"] for w in pool.snapshot()["per_worker"] if w["alive"]]
+        assert await pool._submit(_pid) in alive
+        assert await _wait_all_alive(pool)
+        assert sum(w["restarts"] for w in pool.snapshot()["per_worker"]) == 1
+        await pool.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,161 @@
+import math
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+import inference
+
+
+class TileConfig(NamedTuple):
+    tile_size: int = 1280     # сторона тайла в пикселях исходника
+    overlap: float = 0.2      # доля перекрытия соседних тайлов
+    max_tiles: int = 16       # бюджет тайлов на кадр (без полного кадра)
+    iou_thr: float = 0.5      # порог NMS при склейке
+    ios_thr: float = 0.7      # доля обрезанного бокса внутри целого, при которой обрезанный — дубль
+    include_full: bool = True  # добавлять ли весь кадр отдельным входом батча
+
+
+class Tile(NamedTuple):
+    x: int
+    y: int
+    w: int
+    h: int
+
+
+def _axis_positions(length: int, tile: int, overlap: float) -> List[int]:
+    if length <= tile:
+        return [0]
+    step = max(1, int(tile * (1.0 - overlap)))
+    n = math.ceil((length - tile) / step) + 1
+    # равномерно раскладываем так, чтобы последний тайл заканчивался ровно на краю
+    return [round(i * (length - tile) / (n - 1)) for i in range(n)]
+
+
+def plan_tiles(width: int, height: int, tile_size: int, overlap: float, max_tiles: int) -> List[Tile]:
+    """
+    Сетка перекрывающихся тайлов. Если тайлов больше max_tiles, тайл увеличивается,
+    пока сетка не уложится в бюджет: стоимость растёт с числом тайлов, а не с площадью кадра.
+    """
+    overlap = min(max(overlap, 0.0), 0.9)
+    tile = max(1, tile_size)
+    while True:
+        xs = _axis_positions(width, tile, overlap)
+        ys = _axis_positions(height, tile, overlap)
+        if len(xs) * len(ys) <= max(1, max_tiles) or tile >= max(width, height):
+            break
+        tile = int(tile * 1.25) + 1
+    tw, th = min(tile, width), min(tile, height)
+    return [Tile(x, y, tw, th) for y in ys for x in xs]
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray, iou_thr: float) -> np.ndarray:
+    """NMS по классам: индексы оставленных боксов по убыванию score."""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    # сдвиг по классу разводит боксы разных классов, чтобы они не подавляли друг друга
+    offset = classes[:, None].astype(np.float64) * (boxes.max() + 1.0)
+    b = boxes.astype(np.float64) + offset
+    areas = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(b[i, 0], b[rest, 0])
+        yy1 = np.maximum(b[i, 1], b[rest, 1])
+        xx2 = np.minimum(b[i, 2], b[rest, 2])
+        yy2 = np.minimum(b[i, 3], b[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_thr]
+    return np.asarray(keep, dtype=np.int64)
+
+
+# бокс ближе этой доли стороны тайла к его внутренней границе считается обрезанным тайлом
+_EDGE_MARGIN = 0.01
+
+
+def _cut_by_tile(b: Dict[str, Any], tile: Tile, width: int, height: int) -> bool:
+    """Бокс (в координатах кадра) упирается в границу тайла, которая не совпадает с краем кадра."""
+    margin = _EDGE_MARGIN * max(tile.w, tile.h)
+    return (
+        (tile.x > 0 and b["x1"] - tile.x <= margin)
+        or (tile.x + tile.w < width and tile.x + tile.w - b["x2"] <= margin)
+        or (tile.y > 0 and b["y1"] - tile.y <= margin)
+        or (tile.y + tile.h < height and tile.y + tile.h - b["y2"] <= margin)
+    )
+
+
+def _covered_parts(boxes: np.ndarray, classes: np.ndarray, partial: np.ndarray, ios_thr: float) -> np.ndarray:
+    """
+    Маска обрезанных боксов, которые не меньше чем на ios_thr своей площади лежат внутри
+    необрезанного бокса того же класса (intersection over smaller). IoU тут не работает:
+    у половины инструмента и целого инструмента IoU около 0.5 и ниже.
+    """
+    covered = np.zeros(len(boxes), dtype=bool)
+    whole = np.flatnonzero(~partial)
+    for j in np.flatnonzero(partial):
+        w = whole[classes[whole] == classes[j]]
+        if not len(w):
+            continue
+        xx1 = np.maximum(boxes[j, 0], boxes[w, 0])
+        yy1 = np.maximum(boxes[j, 1], boxes[w, 1])
+        xx2 = np.minimum(boxes[j, 2], boxes[w, 2])
+        yy2 = np.minimum(boxes[j, 3], boxes[w, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        area = max((boxes[j, 2] - boxes[j, 0]) * (boxes[j, 3] - boxes[j, 1]), 1e-9)
+        covered[j] = inter.max() / area >= ios_thr
+    return covered
+
+
+def merge(
+    per_tile: List[List[Dict[str, Any]]], tiles: List[Tile], iou_thr: float, ios_thr: float = 0.7
+) -> List[Dict[str, Any]]:
+    """
+    Переводит боксы тайлов в координаты кадра и убирает дубли. Сначала выбрасываются куски
+    инструментов, обрезанные границей тайла, если тот же инструмент целиком найден на полном
+    кадре или в соседнем тайле; оставшиеся дубли из зон перекрытия убирает NMS по IoU.
+    """
+    width = max(t.x + t.w for t in tiles)
+    height = max(t.y + t.h for t in tiles)
+    merged, partial = [], []
+    for bboxes, tile in zip(per_tile, tiles):
+        for b in bboxes:
+            b = {**b, "x1": b["x1"] + tile.x, "x2": b["x2"] + tile.x, "y1": b["y1"] + tile.y, "y2": b["y2"] + tile.y}
+            merged.append(b)
+            partial.append(_cut_by_tile(b, tile, width, height))
+    if not merged:
+        return []
+    boxes = np.array([[b["x1"], b["y1"], b["x2"], b["y2"]] for b in merged], dtype=np.float64)
+    scores = np.array([b["confidence"] for b in merged])
+    classes = np.array([b["class_id"] for b in merged])
+    rest = np.flatnonzero(~_covered_parts(boxes, classes, np.array(partial), ios_thr))
+    keep = nms(boxes[rest], scores[rest], classes[rest], iou_thr)
+    return [merged[i] for i in rest[keep]]
+
+
+def predict_tiled(
+    model,
+    image: inference.DecodedImage,
+    conf: float,
+    imgsz: int,
+    config: TileConfig,
+    timings: Optional[Dict[str, float]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Тайлы одного кадра идут в модель одним батчем; include_full добавляет к ним весь кадр,
+    чтобы крупные инструменты, разрезанные границами тайлов, находились целиком.
+    """
+    height, width = image.array.shape[:2]
+    tiles = plan_tiles(width, height, config.tile_size, config.overlap, config.max_tiles)
+    if config.include_full and len(tiles) > 1:
+        tiles.append(Tile(0, 0, width, height))
+    # срезы — представления массива, без копирования пикселей
+    crops = [image.array[t.y:t.y + t.h, t.x:t.x + t.w] for t in tiles]
+    per_tile = inference.predict_batch(model, crops, conf, imgsz, timings)
+    with inference.timed(timings, "tile_merge"):
+        bboxes = merge(per_tile, tiles, config.iou_thr, config.ios_thr)
+    if image.scale_x != 1.0 or image.scale_y != 1.0:
+        bboxes = inference.rescale(bboxes, image.scale_x, image.scale_y)
+    return bboxes
@@ -0,0 +1,167 @@
+import logging
+import os
+from contextlib import nullcontext
+from typing import Any, ContextManager, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# none | otlp | file | console. Нужен `opentelemetry-sdk` (+ `opentelemetry-exporter-otlp-proto-http` для otlp)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+# Доля новых трейсов, которые записываются; входящий traceparent с флагом sampled записывается всегда
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "0.05"))
+TRACING_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "ml")
+
+# Выставляется в setup_tracing(); пока None, все функции ниже ничего не делают.
+# В процессах-воркерах пула трейсинг не настраивается
+_tracer: Any = None
+_provider: Any = None
+
+
+def _create_exporter(kind: str) -> Any:
+    if kind == "otlp":
+        # адрес и заголовки берутся из стандартных OTEL_EXPORTER_OTLP_*
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter()
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    if kind == "file":
+        # по одному JSON-спану на строку, дописываем в конец
+        out = open(TRACING_FILE, "a", buffering=1, encoding="utf-8")
+        return ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + os.linesep)
+    if kind == "console":
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER {kind!r}")
+
+
+def setup_tracing(service_name: str = TRACING_SERVICE_NAME) -> bool:
+    """Настраивает трейсинг в текущем процессе. False — трейсинг выключен."""
+    global _tracer, _provider
+    if TRACING_EXPORTER == "none" or _tracer is not None:
+        return _tracer is not None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+        exporter = _create_exporter(TRACING_EXPORTER)
+    except ImportError as e:
+        logger.warning("TRACING_EXPORTER=%s, но OpenTelemetry не установлен (%s); трейсинг выключен", TRACING_EXPORTER, e)
+        return False
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO)),
+    )
+    # экспорт идёт в фоновом потоке, не на пути запроса
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    _tracer = trace.get_tracer("ml")
+    return True
+
+
+def shutdown_tracing() -> None:
+    """Досылает накопленные спаны."""
+    global _tracer, _provider
+    if _provider is not None:
+        _provider.shutdown()
+    _tracer = None
+    _provider = None
+
+
+def span(name: str, **attributes: Any) -> ContextManager[Any]:
+    """
+    Дочерний спан текущего. Вне записываемого трейса ничего не создаётся,
+    поэтому в горячем пути это одна проверка контекста.
+    """
+    if _tracer is None:
+        return nullcontext()
+    from opentelemetry import trace
+
+    if not trace.get_current_span().is_recording():
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes or None)
+
+
+def current_context() -> Any:
+    """Контекст записываемого трейса для работы, которая пойдёт в фоновой задаче; иначе None."""
+    if _tracer is None:
+        return None
+    from opentelemetry import context, trace
+
+    if not trace.get_current_span().is_recording():
+        return None
+    return context.get_current()
+
+
+def batch_span(name: str, contexts: List[Any], **attributes: Any) -> ContextManager[Any]:
+    """
+    Спан общей работы нескольких запросов (батча) из их current_context().
+    Родитель — первый записываемый запрос, остальные связаны со спаном через links.
+    Если ни один запрос не записывается, спана нет.
+    """
+    contexts = [c for c in contexts if c is not None]
+    if _tracer is None or not contexts:
+        return nullcontext()
+    from opentelemetry import trace
+
+    links = [trace.Link(trace.get_current_span(c).get_span_context()) for c in contexts[1:]]
+    return _tracer.start_as_current_span(name, context=contexts[0], links=links, attributes=attributes or None)
+
+
+def start_trace(
+    name: str, carrier: Optional[Dict[str, str]] = None, server: bool = False, **attributes: Any
+) -> ContextManager[Any]:
+    """
+    Входной спан: продолжает W3C trace context из carrier (заголовки запроса)
+    или начинает новый трейс с учётом сэмплирования.
+    """
+    if _tracer is None:
+        return nullcontext()
+    from opentelemetry import trace
+    from opentelemetry.propagate import extract
+
+    return _tracer.start_as_current_span(
+        name,
+        context=extract(carrier or {}),
+        kind=trace.SpanKind.SERVER if server else trace.SpanKind.INTERNAL,
+        attributes=attributes or None,
+    )
+
+
+class TracingMiddleware:
+    """ASGI-middleware: серверный спан на каждый запрос, родитель — входящий traceparent."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or _tracer is None:
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        status_code = 500
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with start_trace(f"{scope['method']} {scope['path']}", headers, server=True) as current:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                if current.is_recording():
+                    route = scope.get("route")
+                    template = getattr(route, "path", None)
+                    if template:
+                        # шаблон маршрута вместо пути, чтобы имён спанов было немного
+                        current.update_name(f"{scope['method']} {template}")
+                        current.set_attribute("http.route", template)
+                    current.set_attribute("http.request.method", scope["method"])
+                    current.set_attribute("http.response.status_code", status_code)
@@ -1,60 +1,177 @@
+"""
+Авторазметка исходных фото инструментов: rembg вырезает фон, по маске строится bbox.
+
+    python background_deleter.py --data ./data --output ./dataset --workers 8
+
+Структура data/<класс>/<фото> превращается в YOLO-датасет dataset/{images,labels}/{train,val}.
+Маски и боксы кэшируются по sha256 файла (--cache-dir), так что повторный запуск
+обрабатывает только новые фото. Отладочные картинки с рамками пишутся в --debug-dir,
+--no-debug их отключает.
+"""
+import argparse
+import hashlib
+import json
 import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
 import cv2
-from rembg import remove
 import numpy as np
-import shutil
 
 
-def get_bbox(img_path: str) -> tuple[int, int, int, int, int, int]:
-    print(img_path)
-    input_data = cv2.imread(img_path)
-    mask = remove(input_data, only_mask=True, alpha_matting=True)
+# Сессия rembg на процесс: модель грузится один раз, а не при каждом remove()
+_session = None
+_cache_dir = None
+
+
+def _init_worker(model_name, cache_dir):
+    global _session, _cache_dir
+    from rembg import new_session
+
+    cv2.setNumThreads(1)
+    _session = new_session(model_name)
+    _cache_dir = cache_dir
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def get_bbox(input_data, session=None):
+    """bbox объекта по маске rembg: (x, y, w, h, маска)"""
+    from rembg import remove
+
+    mask = remove(input_data, only_mask=True, alpha_matting=True, session=session)
     x, y, w, h = cv2.boundingRect(mask)
-    x1, y1, x2, y2 = x, y, x + w, y + h
-    output_img = cv2.rectangle(input_data, (x1, y1), (x2, y2), color = (255, 0, 0), thickness=2)
-    print(input_data.shape)
-    size_y, size_x = input_data.shape[:-1]
-    return x + w/2, y + h/2, w, h, size_x, size_y, output_img
+    return x, y, w, h, mask
+
+
+class LabelCache:
+    """Кэш разметки на диске: <dir>/ab/<sha256>.json + маска <sha256>.png"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _base(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def get(self, digest):
+        try:
+            with open(self._base(digest) + ".json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, digest, record, mask):
+        base = self._base(digest)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        cv2.imwrite(base + ".png", mask)
+        tmp = f"{base}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp, base + ".json")
+
+
+def label_image(path, debug_path=None):
+    """Разметка одного фото в процессе-воркере: из кэша или через rembg"""
+    cache = LabelCache(_cache_dir)
+    digest = file_hash(path)
+    record = cache.get(digest)
+    image = None
+    if record is None:
+        image = cv2.imread(path)
+        x, y, w, h, mask = get_bbox(image, session=_session)
+        size_y, size_x = image.shape[:2]
+        record = {"x": x, "y": y, "w": w, "h": h, "size_x": size_x, "size_y": size_y}
+        cache.put(digest, record, mask)
+        record = {**record, "cached": False}
+    else:
+        record = {**record, "cached": True}
+
+    if debug_path:
+        if image is None:
+            image = cv2.imread(path)
+        x1, y1 = record["x"], record["y"]
+        x2, y2 = x1 + record["w"], y1 + record["h"]
+        cv2.imwrite(debug_path, cv2.rectangle(image, (x1, y1), (x2, y2), color=(255, 0, 0), thickness=2))
+    return record
+
+
+def yolo_line(class_id, record):
+    x_center = record["x"] + record["w"] / 2
+    y_center = record["y"] + record["h"] / 2
+    return (f"{class_id} {x_center / record['size_x']} {y_center / record['size_y']} "
+            f"{record['w'] / record['size_x']} {record['h'] / record['size_y']}")
 
 
-data = []
+def _place(src, dst):
+    """Жёсткая ссылка вместо копии, если файловая система позволяет"""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
 
-for class_id, dir in enumerate([i for i in os.walk('./data/')][0][1]):
-    for file in [i for i in os.walk(f'./data/{dir}')][0][2]:
-        data.append((class_id, os.path.join("./data", dir, file)))
 
-data = np.asarray(data)
-np.random.shuffle(data)
+def collect(data_dir):
+    data = []
+    for class_id, class_dir in enumerate(next(os.walk(data_dir))[1]):
+        for file in next(os.walk(os.path.join(data_dir, class_dir)))[2]:
+            data.append((class_id, os.path.join(data_dir, class_dir, file)))
+    return data
 
-train_length = len(data) * 4 // 5
 
-train_X_path = data[:train_length]
-val_X_path = data[train_length:]
+def build_dataset(data_dir="./data", output_dir="./dataset", cache_dir="./.label_cache",
+                  debug_dir="./trash", workers=None, model_name="u2net", seed=None):
+    data = np.asarray(collect(data_dir))
+    np.random.default_rng(seed).shuffle(data)
 
-os.mkdir("./dataset")
+    train_length = len(data) * 4 // 5
+    splits = {"train": data[:train_length], "val": data[train_length:]}
 
-os.mkdir("./dataset/images")
-os.mkdir("./dataset/images/train")
-os.mkdir("./dataset/images/val")
+    for split in splits:
+        os.makedirs(os.path.join(output_dir, "images", split), exist_ok=True)
+        os.makedirs(os.path.join(output_dir, "labels", split), exist_ok=True)
+        if debug_dir:
+            os.makedirs(os.path.join(debug_dir, split), exist_ok=True)
 
-os.mkdir("./dataset/labels")
-os.mkdir("./dataset/labels/train")
-os.mkdir("./dataset/labels/val")
+    computed = cached = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_name, cache_dir)) as pool:
+        for split, items in splits.items():
+            paths = [path for _, path in items]
+            debug_paths = [os.path.join(debug_dir, split, f"img{img_id}.jpg") if debug_dir else None
+                           for img_id in range(1, len(items) + 1)]
+            results = pool.map(label_image, paths, debug_paths, chunksize=4)
+            for img_id, ((class_id, path), record) in enumerate(zip(items, results), start=1):
+                _place(path, os.path.join(output_dir, "images", split, f"img{img_id}.jpg"))
+                with open(os.path.join(output_dir, "labels", split, f"img{img_id}.txt"), "w") as file:
+                    file.write(yolo_line(int(class_id), record))
+                if record["cached"]:
+                    cached += 1
+                else:
+                    computed += 1
+                print(path)
+    print(f"Labelled {computed + cached} images: {computed} computed, {cached} from cache")
 
-os.mkdir('./trash')
-os.mkdir('./trash/train')
-os.mkdir('./trash/val')
 
-for img_id, (class_id, path) in enumerate(train_X_path):
-    x_center, y_center, width, height, size_x, size_y, output_img = get_bbox(path)
-    shutil.copy(path, f"./dataset/images/train/img{img_id+1}.jpg")
-    with open(f"./dataset/labels/train/img{img_id+1}.txt", "w") as file:
-        file.write(f"{class_id} {x_center/size_x} {y_center/size_y} {width/size_x} {height/size_y}")
-    cv2.imwrite(f"./trash/train/img{img_id + 1}.jpg", output_img)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="./data")
+    parser.add_argument("--output", default="./dataset")
+    parser.add_argument("--cache-dir", default="./.label_cache")
+    parser.add_argument("--debug-dir", default="./trash")
+    parser.add_argument("--no-debug", action="store_true", help="не писать отладочные картинки с рамками")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--model", default="u2net", help="модель rembg")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
 
-for img_id, (class_id, path) in enumerate(val_X_path):
-    x_center, y_center, width, height, size_x, size_y, output_img  = get_bbox(path)
-    shutil.copy(path, f"./dataset/images/val/img{img_id+1}.jpg")
-    with open(f"./dataset/labels/val/img{img_id+1}.txt", "w") as file:
-        file.write(f"{class_id} {x_center/size_x} {y_center/size_y} {width/size_x} {height/size_y}")
-    cv2.imwrite(f"./trash/val/img{img_id + 1}.jpg", output_img)
\ No newline at end of file
+    build_dataset(args.data, args.output, args.cache_dir,
+                  debug_dir=None if args.no_debug else args.debug_dir,
+                  workers=args.workers, model_name=args.model, seed=args.seed)
@@ -0,0 +1,83 @@
+"""
+Сравнение прежней вставки через cv2-маски и вставки на месте (compositing.py) на холсте продакшен-размера.
+
+    python bench_compositing.py --pastes 200
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from compositing import feather_mask, paste_alpha, paste_masked
+
+
+def legacy_paste(base_img, obj_img, x, y):
+    """Прежняя реализация SyntheticDatasetGenerator._paste_object"""
+    h, w = obj_img.shape[:2]
+    roi = base_img[y:y+h, x:x+w]
+    gray = cv2.cvtColor(obj_img, cv2.COLOR_BGR2GRAY)
+    _, mask = cv2.threshold(gray, 1, 255, cv2.THRESH_BINARY)
+    mask_inv = cv2.bitwise_not(mask)
+
+    bg = cv2.bitwise_and(roi, roi, mask=mask_inv)
+    fg = cv2.bitwise_and(obj_img, obj_img, mask=mask)
+    combined = cv2.add(bg, fg)
+    base_img[y:y+h, x:x+w] = combined
+    return base_img
+
+
+def make_sprites(rng, n, size):
+    sprites = []
+    for _ in range(n):
+        scale = rng.uniform(0.3, 0.7)
+        h, w = int(size[0] * scale), int(size[1] * scale)
+        obj = np.zeros((h, w, 3), dtype=np.uint8)
+        cv2.ellipse(obj, (w // 2, h // 2), (w // 3, h // 3), 0, 0, 360,
+                    tuple(int(c) for c in rng.integers(20, 255, 3)), -1)
+        gray = cv2.cvtColor(obj, cv2.COLOR_BGR2GRAY)
+        _, mask = cv2.threshold(gray, 1, 255, cv2.THRESH_BINARY)
+        sprites.append((obj, mask))
+    return sprites
+
+
+def run(name, paste, canvas, sprites, positions):
+    tracemalloc.start()
+    started = time.perf_counter()
+    for (obj, mask), (x, y) in zip(sprites, positions):
+        paste(canvas, obj, mask, x, y)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<16} {elapsed * 1000 / len(sprites):8.2f} ms/paste   peak {peak / 1024 ** 2:8.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pastes", type=int, default=100)
+    parser.add_argument("--height", type=int, default=3864)
+    parser.add_argument("--width", type=int, default=5152)
+    parser.add_argument("--sprite", type=int, nargs=2, default=(2000, 1500), metavar=("H", "W"))
+    parser.add_argument("--feather", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sprites = make_sprites(rng, args.pastes, args.sprite)
+    positions = [(int(rng.integers(0, args.width - obj.shape[1])), int(rng.integers(0, args.height - obj.shape[0])))
+                 for obj, _ in sprites]
+    feathered = [(obj, feather_mask(mask, args.feather)) for obj, mask in sprites]
+
+    def canvas():
+        return np.zeros((args.height, args.width, 3), dtype=np.uint8)
+
+    print(f"canvas {args.height}x{args.width}, {args.pastes} pastes")
+    legacy_canvas, masked_canvas = canvas(), canvas()
+    run("legacy cv2", lambda c, o, m, x, y: legacy_paste(c, o, x, y), legacy_canvas, sprites, positions)
+    run("in-place mask", paste_masked, masked_canvas, sprites, positions)
+    run("in-place alpha", paste_alpha, canvas(), feathered, positions)
+    print("mask output identical to legacy:", bool(np.array_equal(legacy_canvas, masked_canvas)))
+
+
+if __name__ == "__main__":
+    main()
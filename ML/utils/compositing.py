@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+
+
+def _roi(canvas, obj, x, y):
+    h, w = obj.shape[:2]
+    return canvas[y:y+h, x:x+w]
+
+
+def paste_masked(canvas, obj, mask, x, y):
+    """
+    Бинарная вставка прямо в холст: пиксели объекта копируются туда, где mask != 0.
+    Эквивалент прежних bitwise_and/add, но cv2.copyTo пишет в ROI-представление холста
+    без временных копий.
+    """
+    if mask.dtype != np.uint8:
+        mask = mask.astype(np.uint8)
+    cv2.copyTo(obj, mask, _roi(canvas, obj, x, y))
+    return canvas
+
+
+def paste_alpha(canvas, obj, alpha, x, y):
+    """
+    Альфа-смешивание с маской 0..255 в холсте на месте.
+    Непрозрачная часть копируется как есть, смешиваются только полупрозрачные пиксели края.
+    """
+    roi = _roi(canvas, obj, x, y)
+    cv2.copyTo(obj, cv2.compare(alpha, 255, cv2.CMP_EQ), roi)
+    edge = cv2.inRange(alpha, 1, 254) > 0
+    if edge.any():
+        a = alpha[edge].astype(np.uint16)[:, None]
+        blended = obj[edge].astype(np.uint16) * a + roi[edge].astype(np.uint16) * (255 - a) + 127
+        roi[edge] = (blended // 255).astype(np.uint8)
+    return canvas
+
+
+def feather_mask(mask, radius):
+    """Мягкий край шириной ~radius пикселей внутрь объекта; за пределы маски альфа не выходит"""
+    binary = np.where(mask > 0, 255, 0).astype(np.uint8)
+    if radius <= 0:
+        return binary
+    k = 2 * int(radius) + 1
+    alpha = cv2.GaussianBlur(binary, (k, k), 0)
+    alpha[binary == 0] = 0
+    return alpha
+
+
+def paste_many(canvas, items, blend="mask"):
+    """Вставка нескольких объектов за один вызов: items — (obj, mask, x, y) в порядке наложения"""
+    paste = paste_alpha if blend == "alpha" else paste_masked
+    for obj, mask, x, y in items:
+        paste(canvas, obj, mask, x, y)
+    return canvas
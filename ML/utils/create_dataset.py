@@ -1,18 +1,25 @@
 import os
 from dataset_generator import SyntheticDatasetGenerator
+from sprite_cache import SpriteCache
 
 
-image_paths = os.listdir("clean_images")
-label_paths = os.listdir("clean_labels")
+if __name__ == "__main__":
+    # sorted: порядок исходников влияет на выбор классов, а значит и на воспроизводимость
+    image_paths = sorted(os.listdir("clean_images"))
+    label_paths = sorted(os.listdir("clean_labels"))
 
-gen = SyntheticDatasetGenerator(
-    image_paths=["clean_images/" + path for path in image_paths],
-    label_paths=["clean_labels/" + path for path in label_paths],
-    output_dir="synthetic_dataset_train",
-    image_size=(3864, 5152),
-    max_classes=2,
-    max_objects_per_class=2,
-    max_overlap=0.2
-)
+    gen = SyntheticDatasetGenerator(
+        image_paths=["clean_images/" + path for path in image_paths],
+        label_paths=["clean_labels/" + path for path in label_paths],
+        output_dir="synthetic_dataset_train",
+        image_size=(3864, 5152),
+        max_classes=2,
+        max_objects_per_class=2,
+        max_overlap=0.2,
+        # исходники декодируются один раз; .npy-копии в кэше общие для всех процессов
+        sprite_cache=SpriteCache(max_bytes=2 * 1024 ** 3,
+                                 pyramid_scales=(0.5, 0.7),
+                                 mmap_dir="sprite_cache"),
+    )
 
-gen.generate(n_samples=20000)
\ No newline at end of file
+    gen.generate(n_samples=20000, workers=os.cpu_count() or 1)
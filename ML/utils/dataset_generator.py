@@ -1,14 +1,42 @@
 import os
 import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import cv2
 import numpy as np
 
+from compositing import feather_mask, paste_alpha, paste_masked
+from shards import ShardWriter, is_shard_done, write_index
+from sprite_cache import SpriteCache
+
+
+# Генератор, переданный в процесс один раз: его кэш спрайтов живёт весь запуск, а не один чанк
+_worker_generator = None
+
+
+def _init_worker(generator):
+    global _worker_generator
+    # Параллелим процессами, поэтому внутри процесса OpenCV работает в один поток
+    cv2.setNumThreads(1)
+    _worker_generator = generator
+
+
+def _generate_chunk(indices, shard_idx):
+    return _worker_generator._generate_range(indices, shard_idx)
+
+
 class SyntheticDatasetGenerator:
     def __init__(self, image_paths, label_paths, output_dir,
                  image_size=(512, 512),
                  max_classes=3,
                  max_objects_per_class=5,
-                 max_overlap=0.2):
+                 max_overlap=0.2,
+                 seed=0,
+                 sprite_cache=None,
+                 placement_candidates=256,
+                 blend="mask",
+                 feather=0):
 
         self.image_paths = image_paths
         self.label_paths = label_paths
@@ -17,6 +45,12 @@ class SyntheticDatasetGenerator:
         self.max_classes = max_classes
         self.max_objects_per_class = max_objects_per_class
         self.max_overlap = max_overlap
+        self.seed = seed
+        self.sprite_cache = sprite_cache if sprite_cache is not None else SpriteCache()
+        self.placement_candidates = placement_candidates
+        # "mask" — бинарная вставка как раньше, "alpha" — смешивание по мягкой маске с растушёвкой feather px
+        self.blend = blend
+        self.feather = feather
 
         os.makedirs(os.path.join(output_dir, "images"), exist_ok=True)
         os.makedirs(os.path.join(output_dir, "labels"), exist_ok=True)
@@ -35,74 +69,199 @@ class SyntheticDatasetGenerator:
             dataset.append((img_path, labels))
         return dataset
 
-    def _paste_object(self, base_img, obj_img, x, y):
-        """Вставка объекта с учётом альфа-маски"""
-        h, w = obj_img.shape[:2]
-        roi = base_img[y:y+h, x:x+w]
-        gray = cv2.cvtColor(obj_img, cv2.COLOR_BGR2GRAY)
-        _, mask = cv2.threshold(gray, 1, 255, cv2.THRESH_BINARY)
-        mask_inv = cv2.bitwise_not(mask)
-
-        bg = cv2.bitwise_and(roi, roi, mask=mask_inv)
-        fg = cv2.bitwise_and(obj_img, obj_img, mask=mask)
-        combined = cv2.add(bg, fg)
-        base_img[y:y+h, x:x+w] = combined
-        return base_img
-
-    def _iou(self, box1, box2):
-        """IoU для проверки пересечений"""
-        x1, y1, w1, h1 = box1
-        x2, y2, w2, h2 = box2
-
-        xa = max(x1, x2)
-        ya = max(y1, y2)
-        xb = min(x1 + w1, x2 + w2)
-        yb = min(y1 + h1, y2 + h2)
-
-        inter_area = max(0, xb - xa) * max(0, yb - ya)
-        union_area = w1*h1 + w2*h2 - inter_area
-        return inter_area / union_area if union_area > 0 else 0
-
-    def generate(self, n_samples=100):
-        for idx in range(n_samples):
-            canvas = np.zeros((self.image_size[0], self.image_size[1], 3), dtype=np.uint8)
-            chosen_classes = random.sample(self.dataset, 
-                                           min(self.max_classes, len(self.dataset)))
-            labels_out = []
-            placed_boxes = []
-
-            for img_path, labels in chosen_classes:
-                num_objects = random.randint(1, self.max_objects_per_class)
-                for _ in range(num_objects):
-                    obj_img = cv2.imread(img_path)
-                    h, w = obj_img.shape[:2]
-
-                    scale = random.uniform(0.3, 0.7)
-                    new_w, new_h = int(w*scale), int(h*scale)
-                    obj_resized = cv2.resize(obj_img, (new_w, new_h))
-
-                    for attempt in range(20):  # ограничим попытки по нахождению места
-                        x = random.randint(0, self.image_size[1] - new_w)
-                        y = random.randint(0, self.image_size[0] - new_h)
-                        new_box = (x, y, new_w, new_h)
-
-                        overlaps = [self._iou(new_box, b) for b in placed_boxes]
-                        if all(o <= self.max_overlap for o in overlaps):
-                            canvas = self._paste_object(canvas, obj_resized, x, y)
-
-                            # YOLO-аннотация
-                            x_center = (x + new_w/2) / self.image_size[1]
-                            y_center = (y + new_h/2) / self.image_size[0]
-                            w_norm = new_w / self.image_size[1]
-                            h_norm = new_h / self.image_size[0]
-
-                            labels_out.append(f"{labels[0][0]} {x_center:.6f} {y_center:.6f} {w_norm:.6f} {h_norm:.6f}")
-                            placed_boxes.append(new_box)
-                            break
-
-            # Сохранение
-            img_name = f"{idx:05d}.jpg"
-            lbl_name = f"{idx:05d}.txt"
-            cv2.imwrite(os.path.join(self.output_dir, "images", img_name), canvas)
-            with open(os.path.join(self.output_dir, "labels", lbl_name), "w") as f:
-                f.write("\n".join(labels_out))
+    def _paste_object(self, base_img, obj_img, x, y, mask=None):
+        """Вставка объекта с учётом альфа-маски (готовую маску можно передать из кэша спрайтов)"""
+        if mask is None:
+            gray = cv2.cvtColor(obj_img, cv2.COLOR_BGR2GRAY)
+            _, mask = cv2.threshold(gray, 1, 255, cv2.THRESH_BINARY)
+        # пишем прямо в холст, без промежуточных копий ROI
+        if self.blend == "alpha":
+            alpha = feather_mask(mask, self.feather) if self.feather else mask
+            return paste_alpha(base_img, obj_img, alpha, x, y)
+        return paste_masked(base_img, obj_img, mask, x, y)
+
+    @staticmethod
+    def _iou_matrix(candidates, placed):
+        """IoU каждого кандидата (K, 4) с каждым размещённым боксом (P, 4), формат x, y, w, h -> (K, P)"""
+        cx1, cy1 = candidates[:, None, 0], candidates[:, None, 1]
+        cx2, cy2 = cx1 + candidates[:, None, 2], cy1 + candidates[:, None, 3]
+        px1, py1 = placed[None, :, 0], placed[None, :, 1]
+        px2, py2 = px1 + placed[None, :, 2], py1 + placed[None, :, 3]
+
+        inter_w = np.clip(np.minimum(cx2, px2) - np.maximum(cx1, px1), 0, None)
+        inter_h = np.clip(np.minimum(cy2, py2) - np.maximum(cy1, py1), 0, None)
+        inter_area = inter_w * inter_h
+        union_area = (candidates[:, None, 2] * candidates[:, None, 3]
+                      + placed[None, :, 2] * placed[None, :, 3] - inter_area)
+        return np.divide(inter_area, union_area, out=np.zeros_like(inter_area, dtype=np.float64),
+                         where=union_area > 0)
+
+    def _find_position(self, np_rng, new_w, new_h, placed_boxes):
+        """
+        Разыгрываем сразу placement_candidates позиций и проверяем их против всех
+        размещённых боксов одним проходом NumPy. Берётся первая позиция с IoU <= max_overlap,
+        как и в прежнем цикле попыток. None — места не нашлось.
+        """
+        max_x = self.image_size[1] - new_w
+        max_y = self.image_size[0] - new_h
+        if max_x < 0 or max_y < 0:
+            return None
+        n = self.placement_candidates
+        xs = np_rng.integers(0, max_x + 1, size=n)
+        ys = np_rng.integers(0, max_y + 1, size=n)
+        if not placed_boxes:
+            return int(xs[0]), int(ys[0])
+
+        candidates = np.stack([xs, ys, np.full(n, new_w), np.full(n, new_h)], axis=1).astype(np.int64)
+        placed = np.asarray(placed_boxes, dtype=np.int64)
+        fits = (self._iou_matrix(candidates, placed) <= self.max_overlap).all(axis=1)
+        first = int(np.argmax(fits))
+        if not fits[first]:
+            return None
+        return int(xs[first]), int(ys[first])
+
+    def _sample_rng(self, idx):
+        """Детерминированный генератор на сэмпл: результат не зависит от числа процессов"""
+        return random.Random(self.seed * 1_000_003 + idx)
+
+    def _sample_paths(self, idx):
+        return (os.path.join(self.output_dir, "images", f"{idx:05d}.jpg"),
+                os.path.join(self.output_dir, "labels", f"{idx:05d}.txt"))
+
+    def _is_done(self, idx):
+        img_path, lbl_path = self._sample_paths(idx)
+        return os.path.exists(img_path) and os.path.exists(lbl_path)
+
+    def _generate_sample(self, idx):
+        rng = self._sample_rng(idx)
+        np_rng = np.random.default_rng([self.seed, idx])
+        canvas = np.zeros((self.image_size[0], self.image_size[1], 3), dtype=np.uint8)
+        chosen_classes = rng.sample(self.dataset,
+                                    min(self.max_classes, len(self.dataset)))
+        labels_out = []
+        placed_boxes = []
+        dropped = 0
+
+        for img_path, labels in chosen_classes:
+            num_objects = rng.randint(1, self.max_objects_per_class)
+            for _ in range(num_objects):
+                scale = rng.uniform(0.3, 0.7)
+                # декодированный исходник и его маска берутся из кэша
+                sprite = self.sprite_cache.get_scaled(img_path, scale)
+                new_h, new_w = sprite.image.shape[:2]
+
+                position = self._find_position(np_rng, new_w, new_h, placed_boxes)
+                if position is None:
+                    dropped += 1
+                    continue
+                x, y = position
+                canvas = self._paste_object(canvas, sprite.image, x, y, sprite.mask)
+
+                # YOLO-аннотация
+                x_center = (x + new_w/2) / self.image_size[1]
+                y_center = (y + new_h/2) / self.image_size[0]
+                w_norm = new_w / self.image_size[1]
+                h_norm = new_h / self.image_size[0]
+
+                labels_out.append(f"{labels[0][0]} {x_center:.6f} {y_center:.6f} {w_norm:.6f} {h_norm:.6f}")
+                placed_boxes.append((x, y, new_w, new_h))
+
+        return canvas, labels_out, dropped
+
+    def _write_sample(self, idx, canvas, labels_out):
+        """Пишем через временные файлы: разметка появляется последней, недописанный сэмпл перегенерируется"""
+        img_path, lbl_path = self._sample_paths(idx)
+        img_tmp = img_path[:-len(".jpg")] + ".tmp.jpg"
+        lbl_tmp = lbl_path + ".tmp"
+        cv2.imwrite(img_tmp, canvas)
+        with open(lbl_tmp, "w") as f:
+            f.write("\n".join(labels_out))
+        os.replace(img_tmp, img_path)
+        os.replace(lbl_tmp, lbl_path)
+
+    def _generate_range(self, indices, shard_idx=None):
+        """
+        Генерирует сэмплы indices в YOLO-каталоги или, если задан shard_idx, в один шард.
+        Возвращает (сэмплов, размещено объектов, отброшено объектов).
+        """
+        writer = ShardWriter(self._shards_dir(), shard_idx) if shard_idx is not None else None
+        placed = dropped = 0
+        try:
+            for idx in indices:
+                canvas, labels_out, sample_dropped = self._generate_sample(idx)
+                if writer is not None:
+                    writer.write(f"{idx:05d}", canvas, labels_out)
+                else:
+                    self._write_sample(idx, canvas, labels_out)
+                placed += len(labels_out)
+                dropped += sample_dropped
+        except BaseException:
+            # в том числе KeyboardInterrupt: неполный шард не должен выглядеть готовым
+            if writer is not None:
+                writer.abort()
+            raise
+        if writer is not None:
+            writer.close()
+        return len(indices), placed, dropped
+
+    def _shards_dir(self):
+        return os.path.join(self.output_dir, "shards")
+
+    def generate(self, n_samples=100, workers=1, resume=True, chunk_size=16, log_every=10.0,
+                 output_format="yolo", samples_per_shard=1000):
+        """
+        workers > 1 — генерация в несколько процессов, сэмплы раздаются чанками.
+        resume=True — уже записанные сэмплы пропускаются, прерванный запуск можно продолжить.
+        output_format="shards" — вместо пары файлов на сэмпл пишутся tar-шарды по
+        samples_per_shard сэмплов в <output_dir>/shards (см. shards.py); шард — единица работы и докачки.
+        """
+        if output_format == "shards":
+            os.makedirs(self._shards_dir(), exist_ok=True)
+            chunks = []
+            for shard_idx, start in enumerate(range(0, n_samples, samples_per_shard)):
+                if resume and is_shard_done(self._shards_dir(), shard_idx):
+                    continue
+                chunks.append((list(range(start, min(start + samples_per_shard, n_samples))), shard_idx))
+            pending = [idx for indices, _ in chunks for idx in indices]
+        elif output_format == "yolo":
+            pending = [idx for idx in range(n_samples) if not (resume and self._is_done(idx))]
+            chunks = [(pending[i:i + chunk_size], None) for i in range(0, len(pending), chunk_size)]
+        else:
+            raise ValueError(f"unknown output_format: {output_format}")
+        skipped = n_samples - len(pending)
+        if skipped:
+            print(f"Skipping {skipped} samples already on disk")
+
+        started = time.perf_counter()
+        last_log = started
+        done = placed = dropped = 0
+
+        def report(force=False):
+            nonlocal last_log
+            now = time.perf_counter()
+            if not force and now - last_log < log_every:
+                return
+            last_log = now
+            elapsed = now - started
+            rate = done / elapsed if elapsed > 0 else 0.0
+            eta = (len(pending) - done) / rate if rate > 0 else float("inf")
+            print(f"{done}/{len(pending)} samples, {rate:.2f} samples/s, ETA {eta:.0f}s, "
+                  f"objects placed {placed}, dropped {dropped}")
+
+        if workers <= 1:
+            for indices, shard_idx in chunks:
+                n, p, d = self._generate_range(indices, shard_idx)
+                done, placed, dropped = done + n, placed + p, dropped + d
+                report()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self,)) as pool:
+                futures = [pool.submit(_generate_chunk, indices, shard_idx) for indices, shard_idx in chunks]
+                for future in as_completed(futures):
+                    n, p, d = future.result()
+                    done, placed, dropped = done + n, placed + p, dropped + d
+                    report()
+        report(force=True)
+        if output_format == "shards":
+            write_index(self._shards_dir())
+        return {"samples": done, "objects_placed": placed, "objects_dropped": dropped}
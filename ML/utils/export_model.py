@@ -0,0 +1,40 @@
+"""
+Экспорт best.pt в форматы для CPU-инференса.
+
+    python export_model.py --format onnx
+    python export_model.py --format openvino
+    python export_model.py --format openvino --int8 --data data.yaml
+
+Результат кладётся рядом с весами (best.onnx, best_openvino_model/, best_int8_openvino_model/)
+и выбирается в сервисе через MODEL_FORMAT=onnx|openvino|openvino_int8.
+"""
+import argparse
+
+from ultralytics import YOLO
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", default="../best.pt")
+    parser.add_argument("--format", choices=("onnx", "openvino"), default="onnx")
+    parser.add_argument("--imgsz", type=int, default=640)
+    # динамические оси нужны, чтобы сервис мог принимать батчи и другой imgsz
+    parser.add_argument("--static", action="store_true", help="фиксированный вход 1x3ximgszximgsz")
+    parser.add_argument("--int8", action="store_true", help="INT8-квантование (OpenVINO), нужен --data для калибровки")
+    parser.add_argument("--data", default="data.yaml", help="датасет для калибровки INT8")
+    parser.add_argument("--opset", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.int8 and args.format != "openvino":
+        parser.error("--int8 is supported for --format openvino only")
+
+    model = YOLO(args.weights)
+    kwargs = dict(format=args.format, imgsz=args.imgsz, dynamic=not args.static)
+    if args.format == "onnx":
+        kwargs.update(simplify=True, opset=args.opset)
+    if args.int8:
+        kwargs.update(int8=True, data=args.data)
+    path = model.export(**kwargs)
+
+    fmt = f"{args.format}_int8" if args.int8 else args.format
+    print(f"Exported to {path}")
+    print(f"Run the service with MODEL_FORMAT={fmt} (or MODEL_PATH={path})")
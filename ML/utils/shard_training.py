@@ -0,0 +1,144 @@
+"""
+Обучение ultralytics прямо из шардов (shards.py), без распаковки в images/ + labels/.
+
+Кадры читаются по смещению из индекса ShardDataset и декодируются в памяти, разметка
+берётся из того же индекса. На диске остаются только tar-архивы — никаких сотен тысяч
+мелких файлов на общем хранилище.
+
+    model.train(data=shard_data_yaml("data.yaml", train_dir, val_dir), trainer=ShardDetectionTrainer)
+"""
+import io
+import math
+import os
+import tempfile
+
+import cv2
+import numpy as np
+import yaml
+from PIL import Image
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import LOGGER, colorstr
+
+from shards import ShardDataset
+
+
+class ShardYOLODataset(YOLODataset):
+    """YOLODataset, у которого `img_path` — каталог шардов с index.jsonl."""
+
+    def __init__(self, *args, cache=None, **kwargs):
+        if cache == "disk":
+            # дисковый кэш — это .npy рядом с каждой картинкой, т.е. те же мелкие файлы
+            LOGGER.warning("cache='disk' is not supported for shards, images are decoded on the fly")
+            cache = None
+        super().__init__(*args, cache=cache, **kwargs)
+
+    def get_img_files(self, img_path):
+        self.shards = ShardDataset(img_path)
+        entries = self.shards.index
+        if isinstance(self.fraction, float) and self.fraction < 1:
+            entries = entries[: round(len(entries) * self.fraction)]
+        elif isinstance(self.fraction, int) and self.fraction > 1:
+            entries = entries[: self.fraction]
+        # пути условные: ultralytics использует их только как имена сэмплов
+        im_files = [os.path.join(img_path, f"{entry['key']}.jpg") for entry in entries]
+        # set_rectangle() переставляет im_files, поэтому сэмпл в шарде ищем по имени
+        self._shard_idx = {f: i for i, f in enumerate(im_files)}
+        return im_files
+
+    def get_labels(self):
+        labels = []
+        for im_file in self.im_files:
+            i = self._shard_idx[im_file]
+            entry = self.shards.index[i]
+            rows = np.array([line.split() for line in entry["labels"]], dtype=np.float32).reshape(-1, 5)
+            labels.append(
+                {
+                    "im_file": im_file,
+                    "shape": tuple(entry["shape"]) if "shape" in entry else self._read_shape(i),
+                    "cls": rows[:, :1],
+                    "bboxes": rows[:, 1:],
+                    "segments": [],
+                    "keypoints": None,
+                    "normalized": True,
+                    "bbox_format": "xywh",
+                }
+            )
+        if not labels:
+            raise FileNotFoundError(f"{self.prefix}No samples in {self.img_path}")
+        return labels
+
+    def _read_shape(self, i):
+        # шарды старого формата без "shape" в индексе: PIL читает только заголовок JPEG
+        with Image.open(io.BytesIO(self.shards.read_bytes(i))) as im:
+            return im.height, im.width
+
+    def load_image(self, i, rect_mode=True, resize_short=False):
+        """Как BaseDataset.load_image, только кадр декодируется из шарда, а не читается из файла"""
+        if self.ims[i] is not None:
+            return self.ims[i], self.im_hw0[i], self.im_hw[i]
+
+        data = self.shards.read_bytes(self._shard_idx[self.im_files[i]])
+        im = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), self.cv2_flag)
+        if im is None:
+            raise FileNotFoundError(f"Can't decode {self.im_files[i]}")
+
+        h0, w0 = im.shape[:2]
+        if rect_mode:
+            r = self.imgsz / max(h0, w0)
+            if r != 1:
+                w, h = min(math.ceil(w0 * r), self.imgsz), min(math.ceil(h0 * r), self.imgsz)
+                im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+        elif not (h0 == w0 == self.imgsz):
+            im = cv2.resize(im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+        if im.ndim == 2:
+            im = im[..., None]
+
+        # буфер последних кадров для мозаики, как в BaseDataset
+        if self.augment and self.cache != "ram":
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, (h0, w0), im.shape[:2]
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+
+        return im, (h0, w0), im.shape[:2]
+
+
+class ShardDetectionTrainer(DetectionTrainer):
+    """DetectionTrainer, у которого train/val в data.yaml — каталоги шардов."""
+
+    def build_dataset(self, img_path, mode="train", batch=None):
+        model = getattr(self.model, "module", self.model)
+        stride = max(int(model.stride.max() if model else 0), 32)
+        cfg = self.args
+        return ShardYOLODataset(
+            img_path=img_path,
+            imgsz=cfg.imgsz,
+            batch_size=batch,
+            augment=mode == "train",
+            hyp=cfg,
+            rect=cfg.rect or mode == "val",
+            cache=cfg.cache or None,
+            single_cls=cfg.single_cls or False,
+            stride=stride,
+            pad=0.0 if mode == "train" else 0.5,
+            prefix=colorstr(f"{mode}: "),
+            task=cfg.task,
+            classes=cfg.classes,
+            data=self.data,
+            fraction=cfg.fraction if mode == "train" else 1.0,
+        )
+
+
+def shard_data_yaml(data_yaml, train_dir, val_dir):
+    """Копия data.yaml, в которой train/val указывают на каталоги шардов; возвращает путь к ней"""
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    data.pop("path", None)
+    data["train"] = os.path.abspath(train_dir)
+    data["val"] = os.path.abspath(val_dir)
+    fd, path = tempfile.mkstemp(prefix="shards-", suffix=".yaml")
+    with os.fdopen(fd, "w") as f:
+        yaml.safe_dump(data, f, allow_unicode=True)
+    return path
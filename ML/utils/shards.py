@@ -0,0 +1,191 @@
+"""
+Шардированный формат датасета: tar-архивы по N сэмплов (`{key}.jpg` + `{key}.txt`,
+как в WebDataset) и JSON-индекс на шард со смещениями и разметкой.
+
+    shards/
+      shard-00000.tar
+      shard-00000.json   # {"shard": ..., "samples": [{"key", "offset", "size", "shape", "labels"}]}
+      index.jsonl        # сводный индекс: одна строка на сэмпл
+"""
+import io
+import json
+import os
+import queue
+import tarfile
+import threading
+
+import cv2
+import numpy as np
+
+
+def shard_name(shard_idx):
+    return f"shard-{shard_idx:05d}"
+
+
+def shard_paths(output_dir, shard_idx):
+    base = os.path.join(output_dir, shard_name(shard_idx))
+    return base + ".tar", base + ".json"
+
+
+def is_shard_done(output_dir, shard_idx):
+    # индекс пишется последним, так что его наличие означает целый шард
+    tar_path, index_path = shard_paths(output_dir, shard_idx)
+    return os.path.exists(tar_path) and os.path.exists(index_path)
+
+
+class ShardWriter:
+    """
+    Пишет один шард в фоновом потоке: JPEG-кодирование и запись на диск идут
+    параллельно с генерацией следующих сэмплов. Очередь ограничена, чтобы
+    генератор не уходил далеко вперёд по памяти.
+    """
+
+    _DONE = object()
+    _ABORT = object()
+
+    def __init__(self, output_dir, shard_idx, queue_size=8, jpeg_quality=95):
+        self.output_dir = output_dir
+        self.shard_idx = shard_idx
+        self.jpeg_quality = jpeg_quality
+        self.tar_path, self.index_path = shard_paths(output_dir, shard_idx)
+        self._entries = []
+        self._error = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, key, image, labels):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((key, image, labels))
+
+    def close(self):
+        """Шард дописан: архив переименовывается из .tmp и пишется индекс."""
+        self._queue.put(self._DONE)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._entries
+
+    def abort(self):
+        """Шард не дописан: .tmp удаляется, индекс не пишется, при докачке шард сгенерируется заново."""
+        self._queue.put(self._ABORT)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _run(self):
+        tmp_path = self.tar_path + ".tmp"
+        item = None
+        try:
+            with tarfile.open(tmp_path, "w") as tar:
+                while True:
+                    item = self._queue.get()
+                    if item is self._DONE or item is self._ABORT:
+                        break
+                    self._add(tar, *item)
+            if item is self._ABORT:
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, self.tar_path)
+            tmp_index = self.index_path + ".tmp"
+            with open(tmp_index, "w") as f:
+                json.dump({"shard": os.path.basename(self.tar_path), "samples": self._entries}, f)
+            os.replace(tmp_index, self.index_path)
+        except BaseException as e:
+            self._error = e
+            # дочитываем очередь, чтобы не заблокировать генератор на put()
+            while item is not self._DONE and item is not self._ABORT:
+                item = self._queue.get()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _add(self, tar, key, image, labels):
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise RuntimeError(f"can't encode sample {key}")
+        data = encoded.tobytes()
+        info = tarfile.TarInfo(f"{key}.jpg")
+        info.size = len(data)
+        # addfile копирует TarInfo, поэтому смещение данных считаем сами: текущая позиция + заголовок
+        offset = tar.offset + len(info.tobuf(tar.format, tar.encoding, tar.errors))
+        tar.addfile(info, io.BytesIO(data))
+
+        label_data = "\n".join(labels).encode()
+        label_info = tarfile.TarInfo(f"{key}.txt")
+        label_info.size = len(label_data)
+        tar.addfile(label_info, io.BytesIO(label_data))
+
+        self._entries.append(
+            {"key": key, "offset": offset, "size": len(data), "shape": list(image.shape[:2]), "labels": labels}
+        )
+
+
+def write_index(output_dir):
+    """Собирает индексы шардов в один index.jsonl"""
+    names = sorted(n for n in os.listdir(output_dir) if n.startswith("shard-") and n.endswith(".json"))
+    tmp_path = os.path.join(output_dir, "index.jsonl.tmp")
+    with open(tmp_path, "w") as out:
+        for name in names:
+            with open(os.path.join(output_dir, name)) as f:
+                shard = json.load(f)
+            for sample in shard["samples"]:
+                out.write(json.dumps({"shard": shard["shard"], **sample}, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, os.path.join(output_dir, "index.jsonl"))
+
+
+class ShardDataset:
+    """
+    Чтение шардов обратно: последовательно (`__iter__`) или по индексу (`__getitem__`,
+    чтение по смещению из индекса без распаковки архива).
+    """
+
+    def __init__(self, shards_dir):
+        self.shards_dir = shards_dir
+        with open(os.path.join(shards_dir, "index.jsonl")) as f:
+            self.index = [json.loads(line) for line in f if line.strip()]
+
+    def __len__(self):
+        return len(self.index)
+
+    def read_bytes(self, i):
+        entry = self.index[i]
+        with open(os.path.join(self.shards_dir, entry["shard"]), "rb") as f:
+            f.seek(entry["offset"])
+            return f.read(entry["size"])
+
+    def __getitem__(self, i):
+        data = np.frombuffer(self.read_bytes(i), dtype=np.uint8)
+        return cv2.imdecode(data, cv2.IMREAD_COLOR), self.index[i]["labels"]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def export_yolo(self, output_dir):
+        """
+        Раскладывает шарды в images/ + labels/ (по два файла на сэмпл); готовые файлы пропускает.
+        Для обучения не нужен — см. shard_training.py. Если всё же распаковывать, то на локальный
+        диск узла, а не на общее хранилище.
+        """
+        os.makedirs(os.path.join(output_dir, "images"), exist_ok=True)
+        os.makedirs(os.path.join(output_dir, "labels"), exist_ok=True)
+        for i, entry in enumerate(self.index):
+            img_path = os.path.join(output_dir, "images", f"{entry['key']}.jpg")
+            lbl_path = os.path.join(output_dir, "labels", f"{entry['key']}.txt")
+            if os.path.exists(img_path) and os.path.exists(lbl_path):
+                continue
+            with open(img_path, "wb") as f:
+                f.write(self.read_bytes(i))
+            with open(lbl_path, "w") as f:
+                f.write("\n".join(entry["labels"]))
+        return len(self.index)
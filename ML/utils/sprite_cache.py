@@ -0,0 +1,121 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+
+class Sprite(NamedTuple):
+    image: np.ndarray  # BGR uint8
+    mask: np.ndarray   # uint8, 255 — объект, 0 — фон
+
+
+def _object_mask(image):
+    """Та же маска, что строил _paste_object: всё ярче порога 1 считается объектом"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, mask = cv2.threshold(gray, 1, 255, cv2.THRESH_BINARY)
+    return mask
+
+
+class SpriteCache:
+    """
+    Кэш декодированных исходников для генератора: изображение + готовая маска.
+
+    max_bytes — бюджет памяти, при превышении вытесняются давно не использованные записи.
+    pyramid_scales — заранее уменьшенные копии (например, (0.5, 0.7)); нужный масштаб
+    получается ресайзом от ближайшего уровня не меньше требуемого, а не от полного размера.
+    mmap_dir — каталог для .npy-копий; их открывают через memory map, так что несколько
+    процессов делят одни и те же страницы в page cache вместо собственных копий.
+    """
+
+    def __init__(self, max_bytes=2 * 1024 ** 3, pyramid_scales=(), mmap_dir=None):
+        self.max_bytes = max_bytes
+        self.pyramid_scales = tuple(sorted(s for s in pyramid_scales if 0 < s < 1))
+        self.mmap_dir = mmap_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        if mmap_dir:
+            os.makedirs(mmap_dir, exist_ok=True)
+
+    def __getstate__(self):
+        # В дочерние процессы передаём только настройки, не содержимое
+        state = self.__dict__.copy()
+        state["_entries"] = OrderedDict()
+        state["_bytes"] = 0
+        return state
+
+    def get(self, path):
+        return self._level(path, 1.0)
+
+    def get_scaled(self, path, scale):
+        """Спрайт в масштабе scale относительно исходника (размеры как int(w*scale), int(h*scale))"""
+        full = self.get(path)
+        h, w = full.image.shape[:2]
+        new_w, new_h = int(w * scale), int(h * scale)
+        level_scale = next((s for s in self.pyramid_scales if s >= scale), 1.0)
+        base = full if level_scale == 1.0 else self._level(path, level_scale)
+        image = cv2.resize(base.image, (new_w, new_h))
+        mask = cv2.resize(base.mask, (new_w, new_h))
+        return Sprite(image, mask)
+
+    def _level(self, path, scale):
+        key = (path, scale)
+        sprite = self._entries.get(key)
+        if sprite is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        sprite = self._load_mmap(path, scale) if self.mmap_dir else None
+        if sprite is None:
+            sprite = self._build(path, scale)
+            if self.mmap_dir:
+                self._store_mmap(path, scale, sprite)
+                sprite = self._load_mmap(path, scale) or sprite
+        self._put(key, sprite)
+        return sprite
+
+    def _build(self, path, scale):
+        if scale == 1.0:
+            image = cv2.imread(path)
+            if image is None:
+                raise FileNotFoundError(path)
+            return Sprite(image, _object_mask(image))
+        full = self.get(path)
+        h, w = full.image.shape[:2]
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        return Sprite(cv2.resize(full.image, size, interpolation=cv2.INTER_AREA),
+                      cv2.resize(full.mask, size, interpolation=cv2.INTER_AREA))
+
+    def _put(self, key, sprite):
+        size = sprite.image.nbytes + sprite.mask.nbytes
+        self._entries[key] = sprite
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.image.nbytes + evicted.mask.nbytes
+
+    def _mmap_prefix(self, path, scale):
+        st = os.stat(path)
+        ident = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{scale}"
+        return os.path.join(self.mmap_dir, hashlib.sha1(ident.encode()).hexdigest())
+
+    def _load_mmap(self, path, scale):
+        prefix = self._mmap_prefix(path, scale)
+        try:
+            return Sprite(np.load(prefix + ".img.npy", mmap_mode="r"),
+                          np.load(prefix + ".mask.npy", mmap_mode="r"))
+        except (OSError, ValueError):
+            return None
+
+    def _store_mmap(self, path, scale, sprite):
+        prefix = self._mmap_prefix(path, scale)
+        # маску пишем первой, изображение последним — по нему проверяется готовность
+        for suffix, array in ((".mask.npy", sprite.mask), (".img.npy", sprite.image)):
+            tmp = f"{prefix}.{os.getpid()}.tmp.npy"
+            np.save(tmp, array)
+            os.replace(tmp, prefix + suffix)
@@ -1,10 +1,29 @@
+import argparse
+
 from ultralytics import YOLO
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    # Датасеты, сгенерированные с output_format="shards", читаются прямо из шардов, без распаковки
+    parser.add_argument("--train-shards", help="каталог шардов вместо synthetic_dataset_train")
+    parser.add_argument("--val-shards", help="каталог шардов вместо synthetic_dataset_test")
+    args = parser.parse_args()
+
+    data = "data.yaml"
+    trainer = None
+    if args.train_shards or args.val_shards:
+        if not (args.train_shards and args.val_shards):
+            parser.error("--train-shards and --val-shards go together")
+        from shard_training import ShardDetectionTrainer, shard_data_yaml
+
+        data = shard_data_yaml("data.yaml", args.train_shards, args.val_shards)
+        trainer = ShardDetectionTrainer
+
     model = YOLO("yolov8n.pt")
 
     model.train(
-        data="data.yaml",
+        data=data,
+        trainer=trainer,
         epochs=50,
         imgsz=640,
         batch=128,
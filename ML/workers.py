@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+import inference
+import tiling
+from errors import ImageDecodeError, ServiceUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Состояние процесса-воркера: своя копия модели на процесс
+_model = None
+_reduced_decode = True
+
+
+def _init_worker(model_path: str, threads: int, reduced_decode: bool = True) -> None:
+    # Ограничиваем потоки до импорта torch, иначе OpenMP/MKL уже создадут пул на все ядра
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import torch
+
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    global _model, _reduced_decode
+    _model = inference.load_model(model_path)
+    _reduced_decode = reduced_decode
+
+
+def _warmup(imgsz: int) -> int:
+    inference.warmup(_model, imgsz)
+    return os.getpid()
+
+
+# Функции воркера возвращают (результат, время этапов): метрики пишет родительский процесс
+Timings = Dict[str, float]
+
+
+def _predict_bytes(
+    items: List[bytes], conf: float, imgsz: int
+) -> Tuple[List[Union[List[Dict[str, Any]], Exception]], Timings]:
+    # декодирование тоже здесь: в процесс передаются сжатые байты, а не массивы пикселей.
+    # Битое изображение получает своё исключение, остальные в батче обрабатываются
+    timings: Timings = {}
+    results: List[Union[List[Dict[str, Any]], Exception]] = []
+    images, positions = [], []
+    with inference.timed(timings, "decode"):
+        for b in items:
+            try:
+                images.append(inference.decode_image(b, imgsz if _reduced_decode else None))
+                positions.append(len(results))
+                results.append([])
+            except ImageDecodeError as e:
+                results.append(e)
+    if images:
+        for pos, bboxes in zip(positions, inference.predict_batch(_model, images, conf, imgsz, timings)):
+            results[pos] = bboxes
+    return results, timings
+
+
+def _predict_tiled_bytes(
+    img_bytes: bytes, conf: float, imgsz: int, config: tiling.TileConfig
+) -> Tuple[List[Dict[str, Any]], Timings]:
+    timings: Timings = {}
+    # тайлам нужен полный кадр, уменьшенное декодирование здесь не используем
+    with inference.timed(timings, "decode"):
+        image = inference.decode_image(img_bytes)
+    return tiling.predict_tiled(_model, image, conf, imgsz, config, timings), timings
+
+
+class _Worker:
+    def __init__(self, executor: ProcessPoolExecutor):
+        self.executor = executor
+        self.in_flight = 0
+        self.batches = 0
+        self.pid: Optional[int] = None
+        # False, пока упавший процесс поднимается заново и прогревается
+        self.alive = True
+        self.restarts = 0
+
+
+class InferencePool:
+    """
+    N процессов инференса, в каждом своя модель и фиксированное число потоков torch.
+    Батчи уходят в наименее загруженный процесс.
+
+    start() поднимает процессы и прогревает каждый; ready становится True только после прогрева.
+    drain() перестаёт принимать работу и ждёт завершения уже отправленных батчей.
+
+    Если процесс умер (OOM killer, segfault в нативном коде), его батчи получают
+    ServiceUnavailable (503, Backend повторит), а сам процесс заменяется новым и прогревается
+    в фоне. Пока заменяются все процессы сразу, ready == False.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        workers: int,
+        threads: int = 1,
+        warmup_imgsz: int = 640,
+        reduced_decode: bool = True,
+        on_timings: Optional[Callable[[Timings], None]] = None,
+    ):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.model_path = model_path
+        self.n_workers = workers
+        self.threads = max(1, threads)
+        self.warmup_imgsz = warmup_imgsz
+        self.reduced_decode = reduced_decode
+        self.on_timings = on_timings
+        self.draining = False
+        self._started = False
+        self._workers: List[_Worker] = []
+        self._restarts: Set["asyncio.Task[None]"] = set()
+        self._idle: Optional[asyncio.Event] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._started and not self.draining and any(w.alive for w in self._workers)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: fork процесса с уже запущенными потоками torch/uvicorn небезопасен
+        return ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(self.model_path, self.threads, self.reduced_decode),
+        )
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers = [_Worker(self._new_executor()) for _ in range(self.n_workers)]
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*(
+            loop.run_in_executor(w.executor, _warmup, self.warmup_imgsz) for w in self._workers
+        ))
+        for w, pid in zip(self._workers, pids):
+            w.pid = pid
+        self._started = True
+
+    async def predict(self, items: List[bytes], conf: float, imgsz: int) -> List[Union[List[Dict[str, Any]], Exception]]:
+        return await self._submit(_predict_bytes, items, conf, imgsz)
+
+    async def predict_tiled(
+        self, img_bytes: bytes, conf: float, imgsz: int, config: tiling.TileConfig
+    ) -> List[Dict[str, Any]]:
+        return await self._submit(_predict_tiled_bytes, img_bytes, conf, imgsz, config)
+
+    async def _submit(self, fn, *args):
+        if not self.ready:
+            raise ServiceUnavailable("inference pool is not accepting work")
+        assert self._idle is not None
+        worker = min((w for w in self._workers if w.alive), key=lambda w: w.in_flight)
+        executor = worker.executor
+        worker.in_flight += 1
+        self._idle.clear()
+        try:
+            loop = asyncio.get_running_loop()
+            try:
+                result, timings = await loop.run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                self._replace(worker, executor)
+                raise ServiceUnavailable("inference worker died, restarting it")
+            if self.on_timings is not None:
+                self.on_timings(timings)
+            return result
+        finally:
+            worker.in_flight -= 1
+            worker.batches += 1
+            if not any(w.in_flight for w in self._workers):
+                self._idle.set()
+
+    def _replace(self, worker: _Worker, executor: ProcessPoolExecutor) -> None:
+        # все батчи умершего процесса падают с BrokenProcessPool; заменяем его один раз
+        if worker.executor is not executor or not worker.alive or self.draining:
+            return
+        logger.warning("Inference worker pid=%s died, starting a new one", worker.pid)
+        worker.alive = False
+        task = asyncio.ensure_future(self._restart(worker))
+        self._restarts.add(task)
+        task.add_done_callback(self._restarts.discard)
+
+    async def _restart(self, worker: _Worker, retry_delay: float = 1.0) -> None:
+        worker.executor.shutdown(wait=False, cancel_futures=True)
+        loop = asyncio.get_running_loop()
+        while not self.draining:
+            worker.executor = self._new_executor()
+            try:
+                worker.pid = await loop.run_in_executor(worker.executor, _warmup, self.warmup_imgsz)
+            except Exception as e:
+                # например, модель недоступна: пробуем снова, пока процесс вне ротации
+                logger.warning("Inference worker failed to start, retrying in %.0fs: %s", retry_delay, e)
+                worker.executor.shutdown(wait=False, cancel_futures=True)
+                await asyncio.sleep(retry_delay)
+                continue
+            worker.restarts += 1
+            worker.alive = True
+            return
+
+    async def drain(self, timeout: float = 30.0) -> bool:
+        """Ждёт завершения отправленных батчей; False, если не успели за timeout."""
+        self.draining = True
+        for task in self._restarts:
+            task.cancel()
+        if self._idle is None:
+            return True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        drained = await self.drain(timeout)
+        for w in self._workers:
+            w.executor.shutdown(wait=drained, cancel_futures=not drained)
+        self._workers = []
+
+    @property
+    def in_flight(self) -> int:
+        return sum(w.in_flight for w in self._workers)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "workers": self.n_workers,
+            "threads_per_worker": self.threads,
+            "ready": self.ready,
+            "draining": self.draining,
+            "in_flight": self.in_flight,
+            "per_worker": [
+                {"pid": w.pid, "alive": w.alive, "in_flight": w.in_flight, "batches": w.batches, "restarts": w.restarts}
+                for w in self._workers
+            ],
+        }
+
+
+def default_threads(workers: int) -> int:
+    """Ядра делятся поровну между процессами, чтобы потоки не конкурировали друг с другом."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+